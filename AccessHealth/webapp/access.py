@@ -0,0 +1,75 @@
+"""
+Which patients and devices a doctor may read.
+
+Access comes from two M2M relations: ``Patient.doctors`` (the doctor treats
+the patient) and ``WearableDevice.authorized_doctors`` (the patient shared
+a device). Both are folded into one per-doctor set that lives in the cache
+and is dropped by the m2m_changed / device receivers in ``signals.py``, so
+listing a whole panel costs one cache read instead of a join per device.
+The cache must be shared between workers (see CACHES in settings), or a
+revoked doctor would keep access in every process but the one that saw
+the change.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Patient, WearableDevice
+
+ACCESS_CACHE_TTL = 60 * 60
+
+
+def access_cache_key(doctor_id):
+    return f"access:doctor:{doctor_id}"
+
+
+def doctor_scope(doctor_id):
+    """Return ``(patient_ids, device_ids)`` frozensets the doctor may read."""
+    key = access_cache_key(doctor_id)
+    scope = cache.get(key)
+    if scope is None:
+        shared = list(
+            WearableDevice.objects.filter(authorized_doctors=doctor_id).values_list('id', 'patient_id')
+        )
+        treated = set(Patient.objects.filter(doctors=doctor_id).values_list('id', flat=True))
+        patient_ids = frozenset(treated | {patient_id for _, patient_id in shared})
+        device_ids = frozenset(
+            {device_id for device_id, _ in shared}
+            | set(WearableDevice.objects.filter(patient_id__in=treated).values_list('id', flat=True))
+        )
+        scope = (patient_ids, device_ids)
+        cache.set(key, scope, ACCESS_CACHE_TTL)
+    return scope
+
+
+def authorized_patient_ids(doctor):
+    return doctor_scope(doctor.pk)[0]
+
+
+def authorized_device_ids(doctor):
+    return doctor_scope(doctor.pk)[1]
+
+
+def doctor_can_view_patient(doctor, patient_id):
+    """A doctor may read a patient's vitals if they treat them or were granted a device."""
+    return patient_id in authorized_patient_ids(doctor)
+
+
+def invalidate_doctor_access(doctor_ids):
+    keys = [access_cache_key(doctor_id) for doctor_id in doctor_ids]
+    cache.delete_many(keys)
+    # Again once committed, in case another worker re-cached the old scope in between
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def user_can_view_patient(user, profile, patient_id):
+    """
+    True for staff, for the patient themself and for doctors with access.
+
+    ``profile`` is the request's resolved profile (``request.profile``), so
+    the check costs no query of its own beyond (for doctors) one cache read.
+    """
+    if user.is_staff:
+        return True
+    if profile.patient is not None:
+        return profile.patient.pk == patient_id
+    return profile.doctor is not None and doctor_can_view_patient(profile.doctor, patient_id)
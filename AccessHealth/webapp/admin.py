@@ -14,7 +14,28 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'created_at')
 admin.site.register(PatientRecord)
 admin.site.register(WearableDevice)
+admin.site.register(LatestReading)
+admin.site.register(ReadingRollup)
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ('reading_type', 'patient', 'min_value', 'max_value', 'is_active')
+    list_filter = ('reading_type', 'is_active')
+
+@admin.register(VitalAlert)
+class VitalAlertAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'reading_type', 'first_value', 'started_at', 'last_seen_at', 'reading_count')
+    list_filter = ('reading_type',)
+
+@admin.register(WearableReading)
+class WearableReadingAdmin(admin.ModelAdmin):
+    list_display = ('device', 'patient', 'reading_type', 'value', 'unit', 'timestamp')
+    list_filter = ('reading_type',)
 admin.site.register(Notification)
+
+@admin.register(NotificationCounter)
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'patient', 'unread', 'updated_at')
 admin.site.register(Hospital)
 admin.site.register(Appointment)
 admin.site.register(DoctorHospital)
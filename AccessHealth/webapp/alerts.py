@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+from django.db.models import Q
+
+from .models import AlertRule, Notification, VitalAlert, WearableDevice
+from .notifications import refresh_unread_counts
+
+# Violations closer together than this belong to the same episode and notify once
+ALERT_DEDUP_WINDOW = timedelta(minutes=30)
+
+
+def load_rules(patient_ids):
+    """
+    Active rules keyed by (patient_id, reading_type) for the given patients.
+
+    Global rules are expanded per patient first so that a patient-specific
+    rule for the same reading_type simply overwrites it.
+    """
+    rules = list(AlertRule.objects.filter(
+        Q(patient__isnull=True) | Q(patient_id__in=patient_ids),
+        is_active=True,
+    ))
+    resolved = {}
+    global_rules = [rule for rule in rules if rule.patient_id is None]
+    for patient_id in patient_ids:
+        for rule in global_rules:
+            resolved[(patient_id, rule.reading_type)] = rule
+    for rule in rules:
+        if rule.patient_id is not None:
+            resolved[(rule.patient_id, rule.reading_type)] = rule
+    return resolved
+
+
+def flag_readings(readings):
+    """Set ``alert`` on each unsaved reading that breaks its rule; return the flagged ones."""
+    if not readings:
+        return []
+    rules = load_rules({reading.patient_id for reading in readings})
+    flagged = []
+    for reading in readings:
+        rule = rules.get((reading.patient_id, reading.reading_type))
+        if rule is not None and rule.is_violated_by(reading.value):
+            reading.alert = True
+            flagged.append(reading)
+    return flagged
+
+
+def raise_alerts(device, flagged):
+    """
+    Record alert episodes for ``flagged`` readings of one device and notify its doctors.
+
+    Violations within ALERT_DEDUP_WINDOW of an existing episode only extend
+    it, so a sustained abnormal vital produces one notification per
+    authorised doctor rather than one per sample. Also keeps
+    ``WearableDevice.alert`` in step with the batch.
+    """
+    device_alert = bool(flagged)
+    if device.alert != device_alert:
+        WearableDevice.objects.filter(pk=device.pk).update(alert=device_alert)
+        device.alert = device_alert
+    if not flagged:
+        return []
+
+    flagged = sorted(flagged, key=lambda reading: reading.timestamp)
+    episodes = {}
+    for episode in VitalAlert.objects.filter(
+        patient_id=device.patient_id,
+        reading_type__in={reading.reading_type for reading in flagged},
+        last_seen_at__gte=flagged[0].timestamp - ALERT_DEDUP_WINDOW,
+        started_at__lte=flagged[-1].timestamp + ALERT_DEDUP_WINDOW,
+    ):
+        episodes.setdefault(episode.reading_type, []).append(episode)
+
+    extended, created = {}, []
+    for reading in flagged:
+        # A late upload can land before an episode as well as after it, so both ends are checked
+        episode = next(
+            (
+                episode for episode in episodes.get(reading.reading_type, [])
+                if episode.started_at - ALERT_DEDUP_WINDOW <= reading.timestamp <= episode.last_seen_at + ALERT_DEDUP_WINDOW
+            ),
+            None,
+        )
+        if episode is not None:
+            episode.started_at = min(episode.started_at, reading.timestamp)
+            episode.last_seen_at = max(episode.last_seen_at, reading.timestamp)
+            episode.reading_count += 1
+            if episode.pk:
+                extended[episode.pk] = episode
+            continue
+        episode = VitalAlert(
+            patient_id=device.patient_id,
+            device_id=device.pk,
+            reading_type=reading.reading_type,
+            first_value=reading.value,
+            started_at=reading.timestamp,
+            last_seen_at=reading.timestamp,
+        )
+        episodes.setdefault(reading.reading_type, []).append(episode)
+        created.append((episode, reading))
+
+    if extended:
+        VitalAlert.objects.bulk_update(extended.values(), ['started_at', 'last_seen_at', 'reading_count'])
+    if created:
+        VitalAlert.objects.bulk_create([episode for episode, _ in created])
+        doctor_ids = list(device.authorized_doctors.values_list('id', flat=True))
+        Notification.objects.bulk_create([
+            Notification(
+                doctor_id=doctor_id,
+                patient_id=device.patient_id,
+                notification_type='patient',
+                title=f"Abnormal {reading.reading_type.replace('_', ' ')}",
+                message=(
+                    f"{device.patient} recorded {f'{reading.value:g} {reading.unit}'.strip()} "
+                    f"on device {device.device_id} at {reading.timestamp:%Y-%m-%d %H:%M}."
+                ),
+            )
+            for _, reading in created
+            for doctor_id in doctor_ids
+        ])
+        if doctor_ids:
+            refresh_unread_counts(doctor_ids, [device.patient_id])
+    return [episode for episode, _ in created]
@@ -0,0 +1,161 @@
+"""
+Baseline-shift detection over each patient's own vital history.
+
+Fixed AlertRule thresholds catch values that are abnormal for anyone; this
+module flags values that are abnormal *for this patient*, using a trailing
+rolling z-score and a rate-of-change test computed with NumPy in one
+vectorised pass per reading type.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Notification, WearableDevice, WearableReading
+from .notifications import refresh_unread_counts
+
+DEFAULT_LOOKBACK = timedelta(days=7)
+DEFAULT_WINDOW = 60
+DEFAULT_Z_THRESHOLD = 3.5
+# Rate-of-change outliers are measured in robust standard deviations (MAD based)
+DEFAULT_ROC_THRESHOLD = 6.0
+
+
+def rolling_zscores(values, window):
+    """
+    z-score of each value against the ``window`` values before it.
+
+    Trailing sums come from cumulative sums, so the whole series is scored
+    in O(n) without a Python loop. The first ``window`` points have no
+    baseline and score NaN; a flat baseline scores 0.
+    """
+    z = np.full(values.shape, np.nan)
+    if values.size <= window:
+        return z
+    c1 = np.concatenate(([0.0], np.cumsum(values)))
+    c2 = np.concatenate(([0.0], np.cumsum(values * values)))
+    end = np.arange(window, values.size)
+    mean = (c1[end] - c1[end - window]) / window
+    var = np.maximum((c2[end] - c2[end - window]) / window - mean * mean, 0.0)
+    std = np.sqrt(var)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z[window:] = np.where(std > 0, (values[window:] - mean) / std, 0.0)
+    return z
+
+
+def rate_scores(seconds, values):
+    """Robust z-score of each point's per-minute rate of change; the first point scores NaN."""
+    scores = np.full(values.shape, np.nan)
+    if values.size < 3:
+        return scores
+    elapsed = np.diff(seconds) / 60.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(elapsed > 0, np.diff(values) / elapsed, 0.0)
+    median = np.median(rate)
+    spread = 1.4826 * np.median(np.abs(rate - median))
+    if spread > 0:
+        scores[1:] = (rate - median) / spread
+    return scores
+
+
+def summarise(kind, reading_type, scores, threshold, recent, stamps, values):
+    """Collapse flagged points inside the ``recent`` mask into one finding, or None."""
+    flagged = recent & (np.abs(np.nan_to_num(scores)) > threshold)
+    if not flagged.any():
+        return None
+    worst = np.flatnonzero(flagged)[np.argmax(np.abs(scores[flagged]))]
+    return {
+        'kind': kind,
+        'reading_type': reading_type,
+        'count': int(flagged.sum()),
+        'score': float(scores[worst]),
+        'value': float(values[worst]),
+        'timestamp': stamps[worst],
+    }
+
+
+def detect_patient(patient_id, since, lookback=DEFAULT_LOOKBACK, window=DEFAULT_WINDOW,
+                   z_threshold=DEFAULT_Z_THRESHOLD, roc_threshold=DEFAULT_ROC_THRESHOLD):
+    """
+    Findings for readings at or after ``since``, scored against ``lookback`` of history.
+
+    All reading types are fetched in one ordered query and split into
+    contiguous slices, so each type is scored as one array.
+    """
+    rows = list(
+        WearableReading.objects.filter(patient_id=patient_id, timestamp__gte=since - lookback)
+        .order_by('reading_type', 'timestamp')
+        .values_list('reading_type', 'timestamp', 'value')
+    )
+    if not rows:
+        return []
+    kinds = np.array([row[0] for row in rows])
+    stamps = [row[1] for row in rows]
+    seconds = np.array([stamp.timestamp() for stamp in stamps])
+    values = np.array([row[2] for row in rows], dtype=float)
+    cutoff = since.timestamp()
+
+    findings = []
+    boundaries = np.flatnonzero(kinds[1:] != kinds[:-1]) + 1
+    for start, stop in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(rows)]))):
+        series, times = values[start:stop], seconds[start:stop]
+        recent = times >= cutoff
+        if not recent.any():
+            continue
+        reading_type = str(kinds[start])
+        for finding in (
+            summarise('baseline', reading_type, rolling_zscores(series, window), z_threshold,
+                      recent, stamps[start:stop], series),
+            summarise('rate', reading_type, rate_scores(times, series), roc_threshold,
+                      recent, stamps[start:stop], series),
+        ):
+            if finding:
+                findings.append(finding)
+    return findings
+
+
+def notify_findings(patient_id, findings):
+    """Create one 'patient' Notification per finding for each doctor authorised on the patient's devices."""
+    if not findings:
+        return []
+    doctor_ids = set(
+        WearableDevice.objects.filter(patient_id=patient_id, authorized_doctors__isnull=False)
+        .values_list('authorized_doctors', flat=True)
+    )
+    titles = {
+        'baseline': "Vitals outside personal baseline",
+        'rate': "Rapid change in vitals",
+    }
+    created = Notification.objects.bulk_create([
+        Notification(
+            doctor_id=doctor_id,
+            patient_id=patient_id,
+            notification_type='patient',
+            title=f"{titles[finding['kind']]}: {finding['reading_type'].replace('_', ' ')}",
+            message=(
+                f"{finding['count']} reading(s) flagged; strongest {finding['value']:g} "
+                f"(score {finding['score']:+.1f}) at {finding['timestamp']:%Y-%m-%d %H:%M}."
+            ),
+        )
+        for finding in findings
+        for doctor_id in doctor_ids
+    ])
+    if created:
+        refresh_unread_counts(doctor_ids, [patient_id])
+    return created
+
+
+def detect_anomalies(since=None, **options):
+    """Run detection for every patient with an active device; returns {patient_id: findings}."""
+    since = since or timezone.now() - timedelta(hours=1)
+    patient_ids = (
+        WearableDevice.objects.filter(is_active=True)
+        .order_by().values_list('patient_id', flat=True).distinct()
+    )
+    results = {}
+    for patient_id in list(patient_ids):
+        findings = detect_patient(patient_id, since, **options)
+        if findings:
+            notify_findings(patient_id, findings)
+            results[patient_id] = findings
+    return results
@@ -0,0 +1,191 @@
+"""
+Retention for raw wearable readings.
+
+Readings older than the retention window are moved out of the hot table
+into gzip-compressed CSV files, one per patient per month, and tracked by
+ReadingArchive rows so that range queries know which files to open. Rows
+are only deleted once their file has been synced to disk and read back.
+"""
+import csv
+import gzip
+import io
+import os
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ReadingArchive, ReadingRollup, RollupWatermark, WearableReading
+
+DEFAULT_RETENTION_DAYS = 90
+ARCHIVE_FIELDS = ('device_id', 'reading_type', 'value', 'unit', 'timestamp', 'alert')
+
+
+def archive_path(patient_id, month):
+    return os.path.join(settings.WEARABLE_ARCHIVE_ROOT, str(patient_id), f"{month:%Y-%m}.csv.gz")
+
+
+def rolled_up_through():
+    """
+    Highest reading id folded into every rollup resolution.
+
+    Readings above it may still be needed to build rollups, so they stay hot.
+    """
+    marks = dict(RollupWatermark.objects.values_list('resolution', 'last_reading_id'))
+    if any(resolution not in marks for resolution, _ in ReadingRollup.RESOLUTION_CHOICES):
+        return 0
+    return min(marks.values())
+
+
+def fsync_path(path):
+    handle = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(handle)
+    finally:
+        os.close(handle)
+
+
+def append_rows(path, rows):
+    """
+    Append rows as a new gzip member; gzip readers treat concatenated members as one stream.
+
+    The member is closed (writing its trailer) before the file is synced,
+    and the directories are synced too so a newly created file survives a
+    crash. Raises OSError unless the rows read back from the file.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    with gzip.open(path, 'at', newline='') as handle:
+        handle.write(buffer.getvalue())
+    fsync_path(path)
+    if os.name == 'posix':
+        fsync_path(directory)
+        fsync_path(os.path.dirname(directory))
+    expected = [[str(value) for value in row] for row in rows]
+    try:
+        with gzip.open(path, 'rt', newline='') as handle:
+            written = list(csv.reader(handle))
+    except (OSError, EOFError) as exc:
+        raise OSError(f"Archive {path} is unreadable: {exc}") from exc
+    if written[-len(expected):] != expected:
+        raise OSError(f"Archive {path} did not read back the {len(expected)} rows just written.")
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def month_starts(first, last):
+    """First day of every month from ``first`` to ``last`` in the current timezone."""
+    first, last = timezone.localtime(first), timezone.localtime(last)
+    month = date(first.year, first.month, 1)
+    while month <= last.date():
+        yield month
+        month = next_month(month)
+
+
+def archive_patient(patient_id, cutoff, max_id):
+    """Move one patient's readings older than ``cutoff`` (and id <= ``max_id``) to archive files."""
+    old = WearableReading.objects.filter(patient_id=patient_id, timestamp__lt=cutoff, id__lte=max_id)
+    span = old.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+    if span['first'] is None:
+        return 0
+    tz = timezone.get_current_timezone()
+    archived = 0
+    for month_start in month_starts(span['first'], span['last']):
+        in_month = old.filter(
+            timestamp__gte=timezone.make_aware(datetime.combine(month_start, time.min), tz),
+            timestamp__lt=timezone.make_aware(datetime.combine(next_month(month_start), time.min), tz),
+        )
+        rows = [
+            (device_id, reading_type, value, unit, timestamp.isoformat(), int(alert))
+            for device_id, reading_type, value, unit, timestamp, alert
+            in in_month.order_by('timestamp').values_list(*ARCHIVE_FIELDS)
+        ]
+        if not rows:
+            continue
+        path = archive_path(patient_id, month_start)
+        # The file is written and verified before the rows are deleted; a crash in
+        # between only leaves duplicates in the archive, which read_entry() drops.
+        append_rows(path, rows)
+        first, last = parse_datetime(rows[0][4]), parse_datetime(rows[-1][4])
+        with transaction.atomic():
+            entry, _ = ReadingArchive.objects.get_or_create(
+                patient_id=patient_id,
+                month=month_start,
+                defaults={'path': path, 'first_timestamp': first, 'last_timestamp': last},
+            )
+            entry.row_count += len(rows)
+            entry.first_timestamp = min(entry.first_timestamp, first)
+            entry.last_timestamp = max(entry.last_timestamp, last)
+            entry.save()
+            in_month.delete()
+        archived += len(rows)
+    return archived
+
+
+def archive_readings(days=DEFAULT_RETENTION_DAYS):
+    """Archive every patient's raw readings older than ``days``; returns rows moved."""
+    cutoff = timezone.now() - timedelta(days=days)
+    max_id = rolled_up_through()
+    patient_ids = (
+        WearableReading.objects.filter(timestamp__lt=cutoff, id__lte=max_id)
+        .order_by().values_list('patient_id', flat=True).distinct()
+    )
+    return sum(archive_patient(patient_id, cutoff, max_id) for patient_id in list(patient_ids))
+
+
+def read_entry(entry):
+    """
+    ``(device_id, reading_type, value, unit, timestamp, alert)`` rows of one archive file.
+
+    Rows written twice (an archive run interrupted before its delete) are
+    yielded once; a missing file yields nothing.
+    """
+    if not os.path.exists(entry.path):
+        return
+    seen = set()
+    with gzip.open(entry.path, 'rt', newline='') as handle:
+        for device_id, kind, value, unit, stamp, alert in csv.reader(handle):
+            key = (device_id, kind, stamp)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield int(device_id), kind, float(value), unit, parse_datetime(stamp), alert == '1'
+
+
+def read_archived(patient_id, start=None, end=None, reading_type=None):
+    """
+    Archived readings for a patient in [start, end), oldest first, as dicts.
+
+    Only files whose recorded time span overlaps the range are opened.
+    """
+    entries = ReadingArchive.objects.filter(patient_id=patient_id)
+    if start:
+        entries = entries.filter(last_timestamp__gte=start)
+    if end:
+        entries = entries.filter(first_timestamp__lt=end)
+    readings = []
+    for entry in entries:
+        for device_id, kind, value, unit, timestamp, alert in read_entry(entry):
+            if reading_type and kind != reading_type:
+                continue
+            if (start and timestamp < start) or (end and timestamp >= end):
+                continue
+            readings.append({
+                'id': None,
+                'device': device_id,
+                'patient': patient_id,
+                'reading_type': kind,
+                'value': value,
+                'unit': unit,
+                'timestamp': timestamp,
+                'alert': alert,
+            })
+    readings.sort(key=lambda reading: reading['timestamp'])
+    return readings
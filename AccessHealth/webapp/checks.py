@@ -0,0 +1,26 @@
+"""
+Deployment checks for settings the app's cross-process invalidation relies on.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when the default cache cannot be seen by other worker processes."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        "The default cache is local to each process.",
+        hint=(
+            "Access scopes, panel versions and the typeahead version are invalidated only in the "
+            "process that made a change. Set REDIS_URL when running more than one worker process."
+        ),
+        id='webapp.W001',
+    )]
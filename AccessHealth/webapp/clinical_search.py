@@ -0,0 +1,168 @@
+"""
+Full-text search over clinical notes.
+
+The clinical fields of every Consultation and PatientRecord are copied
+into a ClinicalSearchDocument row on save (and dropped on delete) by the
+receivers in ``signals.py``. Migration 0026 indexes those rows: an FTS5
+external-content table kept in step by triggers on SQLite, a GIN index over
+a weighted tsvector on PostgreSQL. Searches are limited to the patients a
+doctor treats (``Patient.doctors``; a shared wearable grants vitals, not
+notes) and return HTML-escaped snippets with matches in <mark>.
+"""
+import re
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import ClinicalSearchDocument, Consultation, Patient, PatientRecord
+
+FTS_TABLE = 'webapp_clinicalsearch_fts'
+# bm25 column weights, in FTS column order: diagnosis, complaint, body
+FTS_WEIGHTS = (5.0, 3.0, 1.0)
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', diagnosis), 'A') || "
+    "setweight(to_tsvector('simple', complaint), 'B') || "
+    "setweight(to_tsvector('simple', body), 'C')"
+)
+PG_TEXT = "diagnosis || ' ' || complaint || ' ' || body"
+# Control characters mark matches inside the raw snippet so the text can be escaped before <mark> goes in
+MATCH_START, MATCH_END = '\x02', '\x03'
+SNIPPET_WORDS = 16
+SEARCH_RESULT_LIMIT = 1000
+
+
+def join_text(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def consultation_document(consultation):
+    return ClinicalSearchDocument(
+        source='consultation',
+        source_id=consultation.pk,
+        patient_id=consultation.patient_id,
+        doctor_id=consultation.doctor_id,
+        date=consultation.date,
+        diagnosis=consultation.diagnosis or '',
+        complaint=consultation.chief_complaint or '',
+        body=join_text(
+            consultation.history, consultation.examination, consultation.treatment_plan,
+            consultation.medications, consultation.follow_up_instructions, consultation.notes,
+        ),
+    )
+
+
+def record_document(record):
+    return ClinicalSearchDocument(
+        source='record',
+        source_id=record.pk,
+        patient_id=record.patient_id,
+        doctor_id=record.doctor_id,
+        date=record.created_time.date(),
+        diagnosis=record.diagnosis or '',
+        complaint=record.symptoms or '',
+        body=join_text(record.treatment_plan, record.medicine),
+    )
+
+
+def save_documents(documents):
+    ClinicalSearchDocument.objects.bulk_create(
+        documents,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['source', 'source_id'],
+        update_fields=['patient', 'doctor', 'date', 'diagnosis', 'complaint', 'body'],
+    )
+
+
+def index_consultation(consultation):
+    save_documents([consultation_document(consultation)])
+
+
+def index_record(record):
+    save_documents([record_document(record)])
+
+
+def unindex(source, source_id):
+    ClinicalSearchDocument.objects.filter(source=source, source_id=source_id).delete()
+
+
+def rebuild_clinical_search():
+    """Re-index every consultation and medical record; returns documents written."""
+    written = 0
+    with transaction.atomic():
+        ClinicalSearchDocument.objects.all().delete()
+        for model, build in ((Consultation, consultation_document), (PatientRecord, record_document)):
+            batch = []
+            for instance in model.objects.iterator(chunk_size=500):
+                batch.append(build(instance))
+                if len(batch) == 500:
+                    save_documents(batch)
+                    written += len(batch)
+                    batch = []
+            save_documents(batch)
+            written += len(batch)
+    return written
+
+
+def highlight(raw):
+    """Escape a raw snippet and turn the match sentinels into <mark> tags."""
+    text = escape(raw or '')
+    return mark_safe(text.replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+def search_clinical_notes(doctor, text, limit=SEARCH_RESULT_LIMIT, source=None):
+    """
+    Best-matching notes about the patients ``doctor`` treats, as dicts with ``source``,
+    ``source_id``, ``patient_id``, ``date`` and a highlighted ``snippet``.
+
+    Every word of ``text`` must match, as a prefix. ``source`` limits hits
+    to 'consultation' or 'record'. Returns None where the database has no
+    full-text index.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return []
+    table = ClinicalSearchDocument._meta.db_table
+    # Joined rather than listed as IN (...) parameters, which large panels would overflow
+    treats = Patient.doctors.through._meta.db_table
+    source_filter = 'AND source = %s ' if source else ''
+    source_params = [source] if source else []
+    if connection.vendor == 'sqlite':
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        sql = (
+            f"SELECT d.source, d.source_id, d.patient_id, d.date, "
+            f"snippet({FTS_TABLE}, -1, %s, %s, '…', {SNIPPET_WORDS}) "
+            f"FROM {FTS_TABLE} JOIN {table} d ON d.id = {FTS_TABLE}.rowid "
+            f"JOIN {treats} t ON t.patient_id = d.patient_id AND t.doctor_id = %s "
+            f"WHERE {FTS_TABLE} MATCH %s {source_filter}"
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s"
+        )
+        params = [MATCH_START, MATCH_END, doctor.pk, ' '.join(f'"{term}"*' for term in terms), *source_params, limit]
+    elif connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        sql = (
+            f"SELECT source, source_id, d.patient_id, date, "
+            f"ts_headline('simple', {PG_TEXT}, to_tsquery('simple', %s), %s) "
+            f"FROM {table} d "
+            f"JOIN {treats} t ON t.patient_id = d.patient_id AND t.doctor_id = %s "
+            f"WHERE ({PG_VECTOR}) @@ to_tsquery('simple', %s) {source_filter}"
+            f"ORDER BY ts_rank(({PG_VECTOR}), to_tsquery('simple', %s)) DESC LIMIT %s"
+        )
+        options = f'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_WORDS}, MinWords=6'
+        params = [tsquery, options, doctor.pk, tsquery, *source_params, tsquery, limit]
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        {
+            'source': source,
+            'source_id': source_id,
+            'patient_id': patient_id,
+            'date': date,
+            'snippet': highlight(snippet),
+        }
+        for source, source_id, patient_id, date, snippet in rows
+    ]
@@ -0,0 +1,17 @@
+from .notifications import recipient_of, unread_count
+
+
+def notifications(request):
+    """
+    Unread badge count for the page header.
+
+    Doctor templates read ``unread_notifications_count`` and patient
+    templates ``unread_count``; both come from the stored counter of the
+    profile the middleware already resolved for the request.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or not hasattr(request, 'profile'):
+        return {}
+    recipient = recipient_of(request.profile)
+    count = unread_count(**recipient) if recipient is not None else 0
+    return {'unread_notifications_count': count, 'unread_count': count}
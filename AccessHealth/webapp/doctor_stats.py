@@ -0,0 +1,71 @@
+"""
+Maintenance of the denormalised DoctorStats table.
+
+Search, the doctor API and the settings page read ratings and patient
+counts from DoctorStats instead of aggregating reviews and appointments
+per request. Receivers in ``signals.py`` refresh a doctor's row whenever
+one of their reviews or appointments changes; ``rebuild_doctor_stats``
+recomputes every row after bulk edits that bypass signals.
+"""
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from .models import Appointment, Doctor, DoctorStats, Review
+
+
+def refresh_doctor_stats(doctor_id, create=True):
+    """
+    Recompute one doctor's row from their own reviews and appointments.
+
+    With ``create=False`` only an existing row is updated; deletions use
+    this so that a doctor's cascading delete doesn't recreate their row.
+    """
+    rating = Review.objects.filter(doctor_id=doctor_id).aggregate(avg=Avg('rating'), count=Count('id'))
+    visits = Appointment.objects.filter(doctor_id=doctor_id).aggregate(
+        patients=Count('patient', distinct=True),
+        completed=Count('id', filter=Q(status='completed')),
+    )
+    values = {
+        'avg_rating': rating['avg'] or 0,
+        'review_count': rating['count'],
+        'total_patients': visits['patients'],
+        'completed_appointments': visits['completed'],
+    }
+    if create:
+        DoctorStats.objects.update_or_create(doctor_id=doctor_id, defaults=values)
+    else:
+        DoctorStats.objects.filter(doctor_id=doctor_id).update(**values, updated_at=timezone.now())
+
+
+def rebuild_doctor_stats():
+    """Recompute every doctor's row with two grouped queries; returns rows written."""
+    ratings = {
+        row['doctor_id']: row
+        for row in Review.objects.order_by().values('doctor_id').annotate(avg=Avg('rating'), count=Count('id'))
+    }
+    visits = {
+        row['doctor_id']: row
+        for row in Appointment.objects.order_by().values('doctor_id').annotate(
+            patients=Count('patient', distinct=True),
+            completed=Count('id', filter=Q(status='completed')),
+        )
+    }
+    rows = []
+    for doctor_id in Doctor.objects.values_list('id', flat=True):
+        rating = ratings.get(doctor_id, {})
+        visit = visits.get(doctor_id, {})
+        rows.append(DoctorStats(
+            doctor_id=doctor_id,
+            avg_rating=rating.get('avg') or 0,
+            review_count=rating.get('count', 0),
+            total_patients=visit.get('patients', 0),
+            completed_appointments=visit.get('completed', 0),
+        ))
+    DoctorStats.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['doctor'],
+        update_fields=['avg_rating', 'review_count', 'total_patients', 'completed_appointments', 'updated_at'],
+    )
+    return len(rows)
@@ -0,0 +1,148 @@
+"""
+Facet counts for the find-doctors filters.
+
+One grouped query counts doctors per (specialization, district, gender,
+fee band) combination. Each facet is then summed from those rows in Python
+with every selected filter applied except its own, so a dropdown shows how
+many doctors each of its choices would leave. The rows for the whole
+directory are cached and dropped by the receivers in ``signals.py`` when a
+doctor, a doctor's hospitals or a hospital's fee changes; only a search
+term needs a fresh query.
+
+Facets are keyed by the find-doctors query parameters: ``specialty``,
+``location``, ``gender`` and ``fee``.
+"""
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, OuterRef, Q, Subquery, Value, When
+
+from .models import Doctor, DoctorHospital
+
+FACETS_CACHE_KEY = 'facets:doctors'
+FACETS_TTL = 60 * 60
+# (key, label, lower bound inclusive, upper bound exclusive), fees in RWF
+FEE_BANDS = [
+    ('under-5000', 'Under 5,000 RWF', None, 5000),
+    ('5000-10000', '5,000 - 10,000 RWF', 5000, 10000),
+    ('10000-20000', '10,000 - 20,000 RWF', 10000, 20000),
+    ('20000-up', '20,000 RWF and over', 20000, None),
+]
+NO_FEE_BAND = 'no-fee'
+FEE_BAND_LABELS = {key: label for key, label, _, _ in FEE_BANDS} | {NO_FEE_BAND: 'Fee not listed'}
+# Facet -> column of the grouped rows
+FACET_FIELDS = {
+    'specialty': 'specialization',
+    'location': 'primary_practice_district',
+    'gender': 'gender',
+    'fee': 'fee_band',
+}
+# Facets the listing filters case-insensitively (``__iexact``)
+CASE_INSENSITIVE = {'specialty', 'location'}
+
+
+def fee_subquery():
+    """The consultation fee of one of the doctor's hospitals, as the listing shows it."""
+    return Subquery(
+        DoctorHospital.objects.filter(doctor=OuterRef('pk')).values('hospital__consultation_fee')[:1]
+    )
+
+
+def fee_band_q(band, fee='consultation_fee'):
+    """Filter for doctors whose annotated ``fee`` falls in ``band``; None for an unknown band."""
+    if band == NO_FEE_BAND:
+        return Q(**{f'{fee}__isnull': True})
+    for key, _, low, high in FEE_BANDS:
+        if key == band:
+            condition = Q(**{f'{fee}__isnull': False})
+            if low is not None:
+                condition &= Q(**{f'{fee}__gte': low})
+            if high is not None:
+                condition &= Q(**{f'{fee}__lt': high})
+            return condition
+    return None
+
+
+def fee_band_case(fee='consultation_fee'):
+    return Case(
+        *[When(fee_band_q(key, fee), then=Value(key)) for key, _, _, _ in FEE_BANDS],
+        default=Value(NO_FEE_BAND),
+        output_field=CharField(),
+    )
+
+
+def facet_rows(doctors):
+    """``[(specialization, district, gender, fee_band, count)]`` for ``doctors``, in one query."""
+    grouped = (
+        doctors.order_by()
+        .annotate(consultation_fee=fee_subquery())
+        .annotate(fee_band=fee_band_case())
+        .values(*FACET_FIELDS.values())
+        .annotate(count=Count('pk'))
+    )
+    return [tuple(row[field] for field in FACET_FIELDS.values()) + (row['count'],) for row in grouped]
+
+
+def directory_facet_rows():
+    rows = cache.get(FACETS_CACHE_KEY)
+    if rows is None:
+        rows = facet_rows(Doctor.objects.all())
+        cache.set(FACETS_CACHE_KEY, rows, FACETS_TTL)
+    return rows
+
+
+def invalidate_doctor_facets():
+    cache.delete(FACETS_CACHE_KEY)
+
+
+def matches(facet, value, selected):
+    if facet in CASE_INSENSITIVE:
+        return (value or '').casefold() == selected.casefold()
+    return value == selected
+
+
+def option_label(facet, value):
+    if facet == 'specialty':
+        return dict(Doctor.SPECIALIZATION_CHOICES).get(value, value)
+    if facet == 'gender':
+        return dict(Doctor.GENDER_CHOICES).get(value, value)
+    if facet == 'fee':
+        return FEE_BAND_LABELS.get(value, value)
+    return value
+
+
+def option_order(facet, value):
+    if facet == 'fee':
+        return list(FEE_BAND_LABELS).index(value)
+    return value
+
+
+def doctor_facets(doctors=None, selected=None):
+    """
+    ``{facet: [{'value', 'label', 'count'}, ...]}`` for the filter dropdowns.
+
+    ``doctors`` is the queryset left after the search term (None for the
+    whole directory, served from cache); ``selected`` maps facets to the
+    chosen values, with blanks and "all" ignored. Every value present in
+    ``doctors`` is listed, even when the other filters leave it at zero.
+    """
+    rows = directory_facet_rows() if doctors is None else facet_rows(doctors)
+    selected = {
+        facet: value for facet, value in (selected or {}).items()
+        if facet in FACET_FIELDS and value and value != 'all'
+    }
+    positions = {facet: position for position, facet in enumerate(FACET_FIELDS)}
+    facets = {}
+    for facet, position in positions.items():
+        others = [(positions[other], other, value) for other, value in selected.items() if other != facet]
+        counts = {}
+        for row in rows:
+            value = row[position]
+            if value in (None, ''):
+                continue
+            counts.setdefault(value, 0)
+            if all(matches(other, row[index], value_) for index, other, value_ in others):
+                counts[value] += row[-1]
+        facets[facet] = [
+            {'value': value, 'label': option_label(facet, value), 'count': count}
+            for value, count in sorted(counts.items(), key=lambda item: option_order(facet, item[0]))
+        ]
+    return facets
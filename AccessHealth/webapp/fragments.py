@@ -0,0 +1,55 @@
+"""
+Version stamps for cached dashboard panels.
+
+Dashboard templates wrap each panel in ``{% cache %}`` keyed by the owner
+and the version of the data the panel shows, e.g. a doctor's schedule by
+``versions.appointments``. Writes bump the version for every doctor and
+patient they touch (receivers in ``signals.py``, plus the notification
+counters), so the next render misses the cache for just the stale panels
+while the others are served as stored HTML.
+
+Versions must live in the shared cache (see CACHES in settings) for a
+bump to reach every worker. A bump stores a fresh random version rather
+than incrementing: some cache backends implement ``incr`` as a read and a
+write, so two concurrent bumps could both land on the same number and
+leave a panel rendered between them in place.
+"""
+import uuid
+
+from django.core.cache import cache
+
+# Upper bound on a panel's age; relative times ("5 minutes ago") drift by at most this
+FRAGMENT_TTL = 300
+PANEL_KINDS = ('appointments', 'consultations', 'notifications', 'devices', 'reviews')
+
+
+def version_key(kind, owner, owner_id):
+    return f"fragver:{kind}:{owner}:{owner_id}"
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def bump_versions(kind, doctor_ids=(), patient_ids=()):
+    """Invalidate ``kind`` panels of the given doctors and patients, in one set_many."""
+    versions = {
+        version_key(kind, owner, owner_id): new_version()
+        for owner, ids in (('doctor', doctor_ids), ('patient', patient_ids))
+        for owner_id in {pk for pk in ids if pk is not None}
+    }
+    if versions:
+        cache.set_many(versions, None)
+
+
+def panel_versions(owner, owner_id):
+    """{kind: version} for one doctor or patient, read with a single get_many."""
+    keys = {kind: version_key(kind, owner, owner_id) for kind in PANEL_KINDS}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for kind, key in keys.items():
+        if key not in stored:
+            cache.add(key, new_version(), None)
+            stored[key] = cache.get(key)
+        versions[kind] = stored[key]
+    return versions
@@ -0,0 +1,219 @@
+"""
+Asynchronous ingest path for device telemetry.
+
+Requests are validated and handed to a gateway that owns a long-lived event
+loop on a background thread, so acknowledged readings outlive the request's
+own loop (WSGI and runserver run each async view in a throwaway loop). The
+gateway's flusher writes in size- or time-triggered batches on one writer
+thread, so bursts from many devices neither tie up a thread per request nor
+fight over the SQLite write lock. Each device's samples are written in their
+own transaction: one bad device is logged and dropped without taking the
+rest of the batch with it.
+
+Devices authenticate with their own ingest token (``Authorization: Device
+<token>``, issued by ``manage.py issue_ingest_token``) rather than a user
+session, so the endpoint is CSRF-exempt and a token only writes to its own
+device.
+"""
+import asyncio
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .models import WearableDevice
+from .serializers import WearableReadingBulkSerializer
+from .wearables import IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_TTL, idempotency_cache_key, ingest_readings
+
+logger = logging.getLogger(__name__)
+
+# Requests accepted but not yet written before new ones are pushed back
+QUEUE_MAX_REQUESTS = 1000
+# Flush once this many samples are buffered...
+FLUSH_BATCH_SIZE = 5000
+# ...or once the oldest buffered request is this many seconds old
+FLUSH_INTERVAL = 1.0
+# How long a request may wait for queue space before getting a 503
+ENQUEUE_TIMEOUT = 2.0
+# How long interpreter shutdown waits for queued readings to be written
+SHUTDOWN_TIMEOUT = 10.0
+AUTH_SCHEME = 'Device'
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_ingest_token(device):
+    """Give ``device`` a new ingest token (replacing any old one) and return it; only the hash is stored."""
+    token = secrets.token_urlsafe(32)
+    device.ingest_token_hash = hash_token(token)
+    device.save(update_fields=['ingest_token_hash'])
+    return token
+
+
+def token_matches(device, authorization):
+    """Whether an ``Authorization`` header carries ``device``'s ingest token."""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme != AUTH_SCHEME or not token or not device.ingest_token_hash:
+        return False
+    return hmac.compare_digest(hash_token(token.strip()), device.ingest_token_hash)
+
+
+def write_batch(batch):
+    """Write queued (device, samples) pairs, one transaction and bulk insert per device."""
+    close_old_connections()
+    by_device = {}
+    for device, samples in batch:
+        by_device.setdefault(device.pk, (device, []))[1].extend(samples)
+    for device, samples in by_device.values():
+        try:
+            with transaction.atomic():
+                ingest_readings(device, samples)
+        except Exception:
+            logger.exception("Dropped %d samples for device %s", len(samples), device.device_id)
+
+
+class IngestGateway:
+    """Bounded buffer between request handlers and batched database writes, on its own loop thread."""
+
+    def __init__(self, max_requests=QUEUE_MAX_REQUESTS, batch_size=FLUSH_BATCH_SIZE, interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.loop = asyncio.new_event_loop()
+        # One writer thread keeps database writes serialised
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-writer')
+        self.thread = threading.Thread(target=self.loop.run_forever, name='ingest-gateway', daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(max_requests), self.loop).result()
+
+    async def start(self, max_requests):
+        self.queue = asyncio.Queue()
+        # Slots cover both queued requests and the batch being written
+        self.slots = asyncio.Semaphore(max_requests)
+        self.flusher = asyncio.create_task(self.run())
+
+    async def enqueue(self, device, samples, timeout):
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.queue.put_nowait((device, samples))
+        return True
+
+    async def submit(self, device, samples, timeout=ENQUEUE_TIMEOUT):
+        """Queue samples for ``device``; returns False if no slot freed up within ``timeout``."""
+        future = asyncio.run_coroutine_threadsafe(self.enqueue(device, samples, timeout), self.loop)
+        return await asyncio.wrap_future(future)
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            buffered = len(batch[0][1])
+            deadline = self.loop.time() + self.interval
+            while buffered < self.batch_size:
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                buffered += len(item[1])
+            try:
+                await self.loop.run_in_executor(self.writer, write_batch, batch)
+            except Exception:
+                logger.exception("Dropped ingest batch of %d samples", buffered)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+                    self.slots.release()
+
+    def drain(self, timeout=None):
+        """Block until everything queued so far has been written."""
+        asyncio.run_coroutine_threadsafe(self.queue.join(), self.loop).result(timeout)
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Flush what is queued before the process exits."""
+        try:
+            self.drain(timeout)
+        except TimeoutError:
+            logger.error("Exiting with %d ingest requests still queued", self.queue.qsize())
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway, started on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = IngestGateway()
+            atexit.register(_gateway.shutdown)
+    return _gateway
+
+
+@csrf_exempt
+@require_POST
+async def ingest_view(request, device_id):
+    """
+    Accept ``{"readings": [...]}`` for a device and queue it for batched writing.
+
+    Needs the device's own ingest token (401 otherwise). Responds 202 once
+    queued, or 503 with Retry-After when the buffer is full. Duplicate
+    samples are dropped at write time by ``ingest_readings``.
+    """
+    device = await WearableDevice.objects.filter(device_id=device_id, is_active=True).afirst()
+    # Unknown devices get the same answer as a wrong token, so ids can't be probed
+    if device is None or not token_matches(device, request.headers.get('Authorization')):
+        response = JsonResponse({'detail': 'Invalid or missing device token.'}, status=401)
+        response['WWW-Authenticate'] = AUTH_SCHEME
+        return response
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'detail': 'Malformed JSON.'}, status=400)
+    serializer = WearableReadingBulkSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    # The first request to claim an Idempotency-Key is queued; retries get its answer back
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        cache_key = idempotency_cache_key(device, idempotency_key)
+        if not await cache.aadd(cache_key, IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_TTL):
+            replay = await cache.aget(cache_key)
+            if replay == IDEMPOTENCY_IN_PROGRESS:
+                return JsonResponse({'detail': 'A request with this Idempotency-Key is in progress.'}, status=409)
+            if replay is not None:
+                return JsonResponse(replay, status=200)
+            await cache.aset(cache_key, IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_TTL)
+
+    samples = serializer.validated_data['readings']
+    received = timezone.now()
+    for sample in samples:
+        # Stamp at receipt, not at flush, when the device sent no timestamp
+        sample.setdefault('timestamp', received)
+    if not await get_gateway().submit(device, samples):
+        if idempotency_key:
+            await cache.adelete(cache_key)
+        response = JsonResponse({'detail': 'Ingest queue is full, retry later.'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    body = {'device': device_id, 'queued': len(samples)}
+    if idempotency_key:
+        await cache.aset(cache_key, body, IDEMPOTENCY_TTL)
+    return JsonResponse(body, status=202)
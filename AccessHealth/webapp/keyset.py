@@ -0,0 +1,121 @@
+"""
+Keyset ("seek") pagination.
+
+Rows are ordered by a sort key plus the primary key, and a page is fetched
+relative to the edge row the client last saw (``WHERE (key, pk) > (last
+key, last pk)``) instead of by page number. The database seeks straight to
+that row through the ordering rather than counting and skipping every
+earlier row with OFFSET, and no COUNT(*) is run, so a deep page costs the
+same as the first. ``approximate_count`` gives a cheap total where a
+"about N results" line is wanted.
+
+Cursors are opaque URL-safe strings; a malformed one is treated as no
+cursor (the first page).
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+COUNT_CAP = 1000
+
+
+def encode_cursor(value, pk, backwards=False):
+    payload = [None if value is None else str(value), pk, int(backwards)]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """``(value, pk, backwards)`` from ``cursor``, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk, backwards = json.loads(raw)
+        return value, int(pk), bool(backwards)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours (None at either end)."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_page(queryset, key, per_page, cursor=None, descending=False):
+    """
+    The page of ``queryset`` after (or before) ``cursor``, ordered by ``key`` then pk.
+
+    ``key`` is a non-null field or annotation of ``queryset``; ties on it
+    are broken by pk in the same direction.
+    """
+    decoded = decode_cursor(cursor)
+    backwards = bool(decoded and decoded[2])
+    # Paging backwards walks the ordering in reverse, then flips the rows back
+    ascending = descending == backwards
+    rows = queryset
+    if decoded:
+        try:
+            value = queryset.query.resolve_ref(key).output_field.to_python(decoded[0])
+        except ValidationError:
+            # e.g. a cursor carried over from another sort order
+            value = None
+        if value is not None:
+            after = 'gt' if ascending else 'lt'
+            rows = rows.filter(Q(**{f'{key}__{after}': value}) | Q(**{key: value, f'pk__{after}': decoded[1]}))
+        else:
+            decoded, backwards, ascending = None, False, not descending
+    prefix = '' if ascending else '-'
+    rows = list(rows.order_by(f'{prefix}{key}', f'{prefix}pk')[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    has_next = True if backwards else more
+    has_previous = more if backwards else decoded is not None
+    return KeysetPage(
+        rows,
+        encode_cursor(getattr(rows[-1], key), rows[-1].pk) if rows and has_next else None,
+        encode_cursor(getattr(rows[0], key), rows[0].pk, backwards=True) if rows and has_previous else None,
+    )
+
+
+def approximate_count(queryset, cap=COUNT_CAP):
+    """
+    ``(count, exact)`` for ``queryset`` without a full COUNT(*).
+
+    PostgreSQL answers from the planner's row estimate; elsewhere rows are
+    counted up to ``cap``, and a capped result is reported as inexact.
+    """
+    queryset = queryset.order_by()
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows'], False
+    count = queryset.values('pk')[:cap + 1].count()
+    return min(count, cap), count <= cap
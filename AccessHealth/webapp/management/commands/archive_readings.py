@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from webapp.archive import DEFAULT_RETENTION_DAYS, archive_readings
+
+
+class Command(BaseCommand):
+    help = (
+        "Move raw wearable readings older than the retention window into compressed "
+        "per-patient monthly archives. Only readings already folded into every rollup "
+        "resolution are moved, so run rollup_readings first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_RETENTION_DAYS,
+            help=f"Keep this many days of raw readings in the database (default {DEFAULT_RETENTION_DAYS}).",
+        )
+
+    def handle(self, *args, **options):
+        moved = archive_readings(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} readings"))
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from webapp.models import Patient, WearableDevice, WearableReading
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-ingest'
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the wearable bulk ingest API in-process: seed N devices on bench patients, "
+        "post batches at a target request rate and report latency percentiles, throughput "
+        "and database growth. Writes to the configured database; seeded rows are removed "
+        "afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=20, help="Simulated devices (default 20).")
+        parser.add_argument('--rate', type=float, default=20.0, help="Target requests per second (default 20).")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run (default 10).")
+        parser.add_argument('--batch', type=int, default=100, help="Readings per request (default 100).")
+        parser.add_argument('--threads', type=int, default=4, help="Concurrent client threads (default 4).")
+        parser.add_argument('--keep', action='store_true', help="Keep seeded patients, devices and readings.")
+
+    def handle(self, *args, **options):
+        try:
+            devices = self.seed(options['devices'])
+            rows_before = WearableReading.objects.count()
+            size_before = self.database_size()
+
+            latencies, errors = self.drive(devices, options)
+
+            rows_after = WearableReading.objects.count()
+            size_after = self.database_size()
+            self.report(latencies, errors, options, rows_after - rows_before, size_before, size_after)
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+    def seed(self, count):
+        devices = []
+        for i in range(count):
+            user, _ = User.objects.get_or_create(username=f'{BENCH_PREFIX}-{i}')
+            patient, _ = Patient.objects.get_or_create(
+                user=user,
+                defaults={
+                    'patient_national_id': f'BENCH{i:011d}',
+                    'first_name': 'Bench',
+                    'last_name': f'Device {i}',
+                    'dob': date(1990, 1, 1),
+                    'gender': 'O',
+                    'district': 'Bench',
+                    'sector': 'Bench',
+                    'phone_number': '0000000000',
+                },
+            )
+            device, _ = WearableDevice.objects.get_or_create(
+                device_id=f'{BENCH_PREFIX}-{i}',
+                defaults={
+                    'patient': patient,
+                    'device_type': 'Smartwatch',
+                    'model': 'Bench',
+                    'reading_type': 'heart_rate',
+                    'unit': 'bpm',
+                },
+            )
+            devices.append(device)
+        return devices
+
+    def drive(self, devices, options):
+        """
+        Issue requests on a fixed arrival timetable (open loop).
+
+        Request ``n`` is due at ``start + n / rate`` whether or not earlier
+        ones have finished, and its latency runs from that due time, so time
+        spent waiting for a free client thread counts as queueing delay
+        instead of silently lowering the offered rate.
+        """
+        total = int(options['rate'] * options['duration'])
+        interval = 1.0 / options['rate']
+        batch = options['batch']
+        # Each device gets its own clock so samples never collide with the dedup constraint
+        clocks = {device.pk: timezone.now() - timedelta(days=1) for device in devices}
+        owners = {device.pk: device.patient.user for device in devices}
+        lock = threading.Lock()
+        latencies, errors = [], []
+        started = time.perf_counter()
+
+        def send(n):
+            due = started + n * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            device = devices[n % len(devices)]
+            with lock:
+                first = clocks[device.pk]
+                clocks[device.pk] = first + timedelta(seconds=batch)
+            readings = [
+                {'reading_type': 'heart_rate', 'value': 60 + (n + k) % 40, 'unit': 'bpm',
+                 'timestamp': (first + timedelta(seconds=k)).isoformat()}
+                for k in range(batch)
+            ]
+            # Post as the device's own patient; other users may not write to it. Server errors
+            # come back as 500s: re-raising is unreliable across threads, since the test
+            # client's exception hook is a global signal every concurrent client receives.
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(owners[device.pk])
+            try:
+                outcome = client.post(
+                    f'/api/wearables/{device.pk}/readings/bulk/', {'readings': readings}, format='json'
+                ).status_code
+            except Exception as exc:
+                # Anything else raised client-side is counted too, rather than aborting the run
+                outcome = type(exc).__name__
+            elapsed = time.perf_counter() - due
+            with lock:
+                if outcome == 201:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(outcome)
+
+        # The test client sends Host: testserver, which ALLOWED_HOSTS normally rejects
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(send, range(total)))
+        self.wall_time = time.perf_counter() - started
+        return np.array(latencies), errors
+
+    def database_size(self):
+        if connection.vendor == 'sqlite':
+            path = connection.settings_dict['NAME']
+            return os.path.getsize(path) if os.path.exists(str(path)) else None
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_database_size(current_database())")
+                return cursor.fetchone()[0]
+        return None
+
+    def report(self, latencies, errors, options, rows, size_before, size_after):
+        ok = latencies.size
+        self.stdout.write(f"requests:   {ok} ok, {len(errors)} failed (target {options['rate']:g}/s)")
+        if ok:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            self.stdout.write(f"latency:    p50 {p50:.1f} ms  p95 {p95:.1f} ms  p99 {p99:.1f} ms")
+        self.stdout.write(
+            f"throughput: {ok / self.wall_time:.1f} req/s, {rows / self.wall_time:.0f} readings/s "
+            f"over {self.wall_time:.1f}s"
+        )
+        growth = f"+{rows} readings"
+        if size_before is not None and size_after is not None:
+            growth += f", database +{(size_after - size_before) / 1024:.0f} KiB"
+        self.stdout.write(f"growth:     {growth}")
+        if errors:
+            counts = {outcome: errors.count(outcome) for outcome in set(errors)}
+            summary = ', '.join(f"{outcome} x{count}" for outcome, count in sorted(counts.items(), key=str))
+            self.stdout.write(self.style.WARNING(f"failures: {summary}"))
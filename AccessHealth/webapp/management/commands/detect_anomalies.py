@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from webapp.anomalies import (
+    DEFAULT_LOOKBACK, DEFAULT_ROC_THRESHOLD, DEFAULT_WINDOW, DEFAULT_Z_THRESHOLD, detect_anomalies,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Flag readings that depart from each patient's own baseline (rolling z-score and "
+        "rate of change) and notify the doctors authorised on their devices. Meant to be "
+        "scheduled, e.g. hourly with --since-minutes 60."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since-minutes', type=int, default=60,
+                            help="Only report readings from the last N minutes (default 60).")
+        parser.add_argument('--lookback-hours', type=int, default=int(DEFAULT_LOOKBACK.total_seconds() // 3600),
+                            help="History used to build the baseline (default one week).")
+        parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                            help=f"Readings in the rolling baseline (default {DEFAULT_WINDOW}).")
+        parser.add_argument('--z', type=float, default=DEFAULT_Z_THRESHOLD,
+                            help=f"Baseline z-score threshold (default {DEFAULT_Z_THRESHOLD}).")
+        parser.add_argument('--rate', type=float, default=DEFAULT_ROC_THRESHOLD,
+                            help=f"Rate-of-change threshold in robust std devs (default {DEFAULT_ROC_THRESHOLD}).")
+
+    def handle(self, *args, **options):
+        results = detect_anomalies(
+            since=timezone.now() - timedelta(minutes=options['since_minutes']),
+            lookback=timedelta(hours=options['lookback_hours']),
+            window=options['window'],
+            z_threshold=options['z'],
+            roc_threshold=options['rate'],
+        )
+        for patient_id, findings in results.items():
+            for finding in findings:
+                self.stdout.write(
+                    f"patient {patient_id}: {finding['kind']} {finding['reading_type']} "
+                    f"x{finding['count']} (score {finding['score']:+.1f})"
+                )
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} patient(s) with findings"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp.ingest_gateway import issue_ingest_token
+from webapp.models import WearableDevice
+
+
+class Command(BaseCommand):
+    help = "Issue a new ingest token for a device, replacing any previous one. The token is shown only once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('device_id', help="The device's device_id.")
+
+    def handle(self, *args, **options):
+        device = WearableDevice.objects.filter(device_id=options['device_id']).first()
+        if device is None:
+            raise CommandError(f"No device with device_id {options['device_id']!r}.")
+        token = issue_ingest_token(device)
+        self.stdout.write(f"Authorization: Device {token}")
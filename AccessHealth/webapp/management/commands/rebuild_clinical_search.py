@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from webapp.clinical_search import rebuild_clinical_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents for every consultation and medical record."
+
+    def handle(self, *args, **options):
+        written = rebuild_clinical_search()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} clinical notes"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from webapp.search import rebuild_doctor_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild every doctor's full-text search document from their profile and hospitals."
+
+    def handle(self, *args, **options):
+        written = rebuild_doctor_search()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} doctors"))
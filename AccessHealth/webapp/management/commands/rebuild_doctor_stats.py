@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from webapp.doctor_stats import rebuild_doctor_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalised DoctorStats row of every doctor from reviews and appointments."
+
+    def handle(self, *args, **options):
+        written = rebuild_doctor_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {written} doctors"))
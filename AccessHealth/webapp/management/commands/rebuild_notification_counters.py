@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from webapp.notifications import rebuild_notification_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the unread notification counter of every doctor and patient."
+
+    def handle(self, *args, **options):
+        written = rebuild_notification_counters()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt unread counters for {written} recipients"))
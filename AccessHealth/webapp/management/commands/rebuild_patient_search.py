@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from webapp.patient_search import rebuild_patient_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the normalised name tokens used for patient lookup."
+
+    def handle(self, *args, **options):
+        written = rebuild_patient_search()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} patient search tokens"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from webapp.rollups import RESOLUTIONS, rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregate raw wearable readings into per-minute / hourly / daily rollups. "
+        "A reading is folded by the first run at least a minute after a run has seen it, "
+        "so schedule this periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--resolution',
+            action='append',
+            choices=RESOLUTIONS,
+            help="Resolution to build (repeatable). Defaults to all of them.",
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="Drop existing rollups and recompute from every raw reading instead of "
+                 "folding in only readings ingested since the last run.",
+        )
+
+    def handle(self, *args, **options):
+        for resolution in options['resolution'] or RESOLUTIONS:
+            if options['rebuild']:
+                folded = rebuild_rollups(resolution)
+            else:
+                folded = update_rollups(resolution)
+            self.stdout.write(self.style.SUCCESS(f"{resolution}: folded {folded} readings"))
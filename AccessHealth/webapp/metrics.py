@@ -0,0 +1,57 @@
+"""
+Cached per-doctor dashboard metrics.
+
+The counters are computed with one conditional-aggregation query over the
+doctor's appointments plus the DoctorStats rating, then cached briefly. The
+Appointment/Review receivers in ``signals.py`` drop the entry on writes so
+the numbers are never more stale than a single request.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Appointment, DoctorStats, Patient
+
+DOCTOR_METRICS_TTL = 60
+
+
+def doctor_metrics_key(doctor_id, today=None):
+    today = today or timezone.now().date()
+    # The date is part of the key so "this month" rolls over without an invalidation
+    return f"metrics:doctor:{doctor_id}:{today.isoformat()}"
+
+
+def compute_doctor_metrics(doctor, today):
+    counts = Appointment.objects.filter(doctor=doctor).aggregate(
+        total_patients=Count('patient', distinct=True),
+        pending_count=Count('id', filter=Q(status='pending')),
+        month_appointments=Count(
+            'id', filter=Q(appointment_date__year=today.year, appointment_date__month=today.month)
+        ),
+    )
+    stats = DoctorStats.objects.filter(doctor=doctor).first()
+    recent_patients = list(
+        Patient.objects.filter(appointments__doctor=doctor)
+        .annotate(last_seen=Max('appointments__appointment_date'))
+        .order_by('-last_seen')[:4]
+    )
+    return {
+        **counts,
+        'avg_rating': round(stats.avg_rating, 1) if stats else 0,
+        'review_count': stats.review_count if stats else 0,
+        'recent_patients': recent_patients,
+    }
+
+
+def get_doctor_metrics(doctor, today=None):
+    today = today or timezone.now().date()
+    key = doctor_metrics_key(doctor.pk, today)
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = compute_doctor_metrics(doctor, today)
+        cache.set(key, metrics, DOCTOR_METRICS_TTL)
+    return metrics
+
+
+def invalidate_doctor_metrics(doctor_id):
+    cache.delete(doctor_metrics_key(doctor_id))
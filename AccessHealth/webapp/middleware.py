@@ -0,0 +1,103 @@
+"""
+Per-request resolution of the logged-in user's Doctor or Patient profile.
+
+``ProfileMiddleware`` attaches ``request.profile``, which looks the profile
+up on first use and memoises it for the rest of the request. The role and
+profile id are remembered in the session, so after the first request a
+profile is always one primary-key lookup rather than a probe of both
+tables. The loaded profile is linked to ``request.user`` in both
+directions, so ``request.user.doctor_profile`` and ``doctor.user`` cost
+nothing either.
+"""
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from .models import Doctor, Patient
+
+SESSION_PROFILE_KEY = '_profile'
+ROLE_MODELS = {'doctor': Doctor, 'patient': Patient}
+
+
+def remember_profile(request, profile):
+    """Record ``profile`` as the session's profile, e.g. right after login."""
+    role = 'doctor' if isinstance(profile, Doctor) else 'patient'
+    request.session[SESSION_PROFILE_KEY] = [profile.user_id, role, profile.pk]
+    if hasattr(request, 'profile'):
+        request.profile.__dict__.pop('resolved', None)
+
+
+class RequestProfile:
+    def __init__(self, request):
+        self.request = request
+
+    def load(self, role, **lookup):
+        profile = ROLE_MODELS[role].objects.filter(user=self.request.user, **lookup).first()
+        if profile is not None:
+            # Link both ways so neither side triggers another query
+            setattr(self.request.user, f'{role}_profile', profile)
+        return profile
+
+    @cached_property
+    def resolved(self):
+        """(role, profile) for the current user; (None, None) for anonymous users or users without one."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return None, None
+        session = self.request.session
+        remembered = session.get(SESSION_PROFILE_KEY)
+        if remembered and remembered[0] == user.pk:
+            _, role, profile_id = remembered
+            profile = self.load(role, pk=profile_id)
+            if profile is not None:
+                return role, profile
+        # Unknown or stale: probe both tables. Users without a profile (staff) are
+        # not remembered, so a profile added to them later is still found.
+        for role in ROLE_MODELS:
+            profile = self.load(role)
+            if profile is not None:
+                # Only cookie sessions are worth writing to; token clients would get a new row each time
+                if session.session_key:
+                    session[SESSION_PROFILE_KEY] = [user.pk, role, profile.pk]
+                return role, profile
+        if remembered:
+            session.pop(SESSION_PROFILE_KEY, None)
+        return None, None
+
+    @property
+    def role(self):
+        return self.resolved[0]
+
+    @property
+    def doctor(self):
+        role, profile = self.resolved
+        return profile if role == 'doctor' else None
+
+    @property
+    def patient(self):
+        role, profile = self.resolved
+        return profile if role == 'patient' else None
+
+
+class ProfileMiddleware:
+    """Attach a lazily resolved ``request.profile``; needs AuthenticationMiddleware before it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = RequestProfile(request)
+        return self.get_response(request)
+
+
+def doctor_or_404(request):
+    """The request's Doctor profile, or Http404 like ``get_object_or_404(Doctor, user=...)``."""
+    if request.profile.doctor is None:
+        raise Http404("No Doctor matches the given query.")
+    return request.profile.doctor
+
+
+def patient_or_404(request):
+    """The request's Patient profile, or Http404 like ``get_object_or_404(Patient, user=...)``."""
+    if request.profile.patient is None:
+        raise Http404("No Patient matches the given query.")
+    return request.profile.patient
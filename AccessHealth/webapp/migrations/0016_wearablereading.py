@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_legacy_readings(apps, schema_editor):
+    # Each WearableDevice row used to carry its single latest sample inline.
+    WearableDevice = apps.get_model('webapp', 'WearableDevice')
+    WearableReading = apps.get_model('webapp', 'WearableReading')
+    WearableReading.objects.bulk_create(
+        [
+            WearableReading(
+                device_id=d.pk,
+                patient_id=d.patient_id,
+                reading_type=d.reading_type,
+                value=float(d.value_of_reading),
+                unit=d.unit,
+                timestamp=d.time,
+            )
+            for d in WearableDevice.objects.exclude(value_of_reading=None).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0015_remove_doctorhospital_consultation_fee_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WearableReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reading_type', models.CharField(max_length=50)),
+                ('value', models.FloatField()),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('timestamp', models.DateTimeField()),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='webapp.wearabledevice')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wearable_readings', to='webapp.patient')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['patient', 'reading_type', 'timestamp'], name='webapp_wear_patient_2db7b9_idx'), models.Index(fields=['device', 'timestamp'], name='webapp_wear_device__d1c2f1_idx')],
+            },
+        ),
+        migrations.RunPython(copy_legacy_readings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_latest(apps, schema_editor):
+    WearableReading = apps.get_model('webapp', 'WearableReading')
+    LatestReading = apps.get_model('webapp', 'LatestReading')
+    seen = set()
+    rows = []
+    readings = WearableReading.objects.order_by('patient_id', 'reading_type', '-timestamp')
+    for r in readings.iterator():
+        key = (r.patient_id, r.reading_type)
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append(LatestReading(
+            patient_id=r.patient_id,
+            device_id=r.device_id,
+            reading_type=r.reading_type,
+            value=r.value,
+            unit=r.unit,
+            timestamp=r.timestamp,
+        ))
+    LatestReading.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0016_wearablereading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reading_type', models.CharField(max_length=50)),
+                ('value', models.FloatField()),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('timestamp', models.DateTimeField()),
+                ('device', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webapp.wearabledevice')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_readings', to='webapp.patient')),
+            ],
+            options={
+                'unique_together': {('patient', 'reading_type')},
+            },
+        ),
+        migrations.RunPython(backfill_latest, migrations.RunPython.noop),
+    ]
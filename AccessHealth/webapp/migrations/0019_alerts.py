@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0018_readingrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wearablereading',
+            name='alert',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reading_type', models.CharField(max_length=50)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('patient', models.ForeignKey(blank=True, help_text='Leave empty for the default rule applied to every patient', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='webapp.patient')),
+            ],
+            options={
+                'unique_together': {('reading_type', 'patient')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VitalAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reading_type', models.CharField(max_length=50)),
+                ('first_value', models.FloatField()),
+                ('started_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+                ('reading_count', models.PositiveIntegerField(default=1)),
+                ('device', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vital_alerts', to='webapp.wearabledevice')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vital_alerts', to='webapp.patient')),
+            ],
+            options={
+                'ordering': ['-last_seen_at'],
+                'indexes': [models.Index(fields=['patient', 'reading_type', 'last_seen_at'], name='webapp_vita_patient_1ce2c6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_readings(apps, schema_editor):
+    # Keep the first copy of each (device, reading_type, timestamp) before enforcing uniqueness
+    WearableReading = apps.get_model('webapp', 'WearableReading')
+    duplicated = (
+        WearableReading.objects.values('device_id', 'reading_type', 'timestamp')
+        .annotate(keep=Min('id'), n=Count('id'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for group in duplicated.iterator():
+        WearableReading.objects.filter(
+            device_id=group['device_id'],
+            reading_type=group['reading_type'],
+            timestamp=group['timestamp'],
+        ).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0019_alerts'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wearablereading',
+            constraint=models.UniqueConstraint(fields=('device', 'reading_type', 'timestamp'), name='unique_device_reading'),
+        ),
+    ]
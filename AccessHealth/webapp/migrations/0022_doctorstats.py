@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Q
+
+
+def backfill_doctor_stats(apps, schema_editor):
+    Doctor = apps.get_model('webapp', 'Doctor')
+    DoctorStats = apps.get_model('webapp', 'DoctorStats')
+    rows = []
+    for doctor in Doctor.objects.all():
+        rating = doctor.reviews.aggregate(avg=Avg('rating'), count=Count('id'))
+        visits = doctor.appointments.aggregate(
+            patients=Count('patient', distinct=True),
+            completed=Count('id', filter=Q(status='completed')),
+        )
+        rows.append(DoctorStats(
+            doctor=doctor,
+            avg_rating=rating['avg'] or 0,
+            review_count=rating['count'],
+            total_patients=visits['patients'],
+            completed_appointments=visits['completed'],
+        ))
+    DoctorStats.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0021_readingarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorStats',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='webapp.doctor')),
+                ('avg_rating', models.FloatField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('total_patients', models.PositiveIntegerField(default=0)),
+                ('completed_appointments', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Doctor stats',
+                'indexes': [models.Index(fields=['avg_rating'], name='webapp_doct_avg_rat_3212b4_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_doctor_stats, migrations.RunPython.noop),
+    ]
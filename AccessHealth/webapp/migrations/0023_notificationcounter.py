@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_notification_counters(apps, schema_editor):
+    Notification = apps.get_model('webapp', 'Notification')
+    NotificationCounter = apps.get_model('webapp', 'NotificationCounter')
+    rows = []
+    for field in ('doctor', 'patient'):
+        unread = (
+            Notification.objects.filter(is_read=False, **{f'{field}__isnull': False})
+            .order_by().values_list(f'{field}_id').annotate(unread=Count('id'))
+        )
+        rows.extend(NotificationCounter(**{f'{field}_id': pk}, unread=count) for pk, count in unread)
+    NotificationCounter.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0022_doctorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['doctor', 'is_read'], name='webapp_noti_doctor__4665ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['patient', 'is_read'], name='webapp_noti_patient_e6c8f7_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationcounter',
+            name='doctor',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notification_counter', to='webapp.doctor'),
+        ),
+        migrations.AddField(
+            model_name='notificationcounter',
+            name='patient',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notification_counter', to='webapp.patient'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationcounter',
+            constraint=models.CheckConstraint(condition=models.Q(('doctor__isnull', True), ('patient__isnull', True), _connector='XOR'), name='notification_counter_one_recipient'),
+        ),
+        migrations.RunPython(backfill_notification_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_COLUMNS = 'name, specialization, bio, hospitals, district'
+NEW_VALUES = 'new.name, new.specialization, new.bio, new.hospitals, new.district'
+OLD_VALUES = 'old.name, old.specialization, old.bio, old.hospitals, old.district'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE webapp_doctorsearch_fts USING fts5(
+        {FTS_COLUMNS}, content='webapp_doctorsearchdocument', content_rowid='doctor_id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER webapp_doctorsearch_ai AFTER INSERT ON webapp_doctorsearchdocument BEGIN
+        INSERT INTO webapp_doctorsearch_fts(rowid, {FTS_COLUMNS}) VALUES (new.doctor_id, {NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER webapp_doctorsearch_ad AFTER DELETE ON webapp_doctorsearchdocument BEGIN
+        INSERT INTO webapp_doctorsearch_fts(webapp_doctorsearch_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.doctor_id, {OLD_VALUES});
+    END""",
+    f"""CREATE TRIGGER webapp_doctorsearch_au AFTER UPDATE ON webapp_doctorsearchdocument BEGIN
+        INSERT INTO webapp_doctorsearch_fts(webapp_doctorsearch_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.doctor_id, {OLD_VALUES});
+        INSERT INTO webapp_doctorsearch_fts(rowid, {FTS_COLUMNS}) VALUES (new.doctor_id, {NEW_VALUES});
+    END""",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS webapp_doctorsearch_au",
+    "DROP TRIGGER IF EXISTS webapp_doctorsearch_ad",
+    "DROP TRIGGER IF EXISTS webapp_doctorsearch_ai",
+    "DROP TABLE IF EXISTS webapp_doctorsearch_fts",
+]
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', specialization), 'B') || "
+    "setweight(to_tsvector('simple', hospitals), 'C') || "
+    "setweight(to_tsvector('simple', district), 'C') || "
+    "setweight(to_tsvector('simple', bio), 'D')"
+)
+POSTGRES_FORWARD = [
+    f"CREATE INDEX webapp_doctorsearch_vector_idx ON webapp_doctorsearchdocument USING GIN (({PG_VECTOR}))",
+]
+POSTGRES_BACKWARD = ["DROP INDEX IF EXISTS webapp_doctorsearch_vector_idx"]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def backfill_search_documents(apps, schema_editor):
+    Doctor = apps.get_model('webapp', 'Doctor')
+    DoctorSearchDocument = apps.get_model('webapp', 'DoctorSearchDocument')
+    rows = []
+    for doctor in Doctor.objects.prefetch_related('hospitals'):
+        hospitals = list(doctor.hospitals.all())
+        places = {doctor.primary_practice_district, doctor.district, doctor.sector}
+        places.update(hospital.district for hospital in hospitals)
+        rows.append(DoctorSearchDocument(
+            doctor=doctor,
+            name=f"{doctor.first_name} {doctor.last_name}",
+            specialization=f"{doctor.specialization} {doctor.get_specialization_display()}",
+            bio=doctor.professional_bio or '',
+            hospitals=' '.join(
+                [doctor.hospital_or_clinic_affiliation or ''] + [hospital.name for hospital in hospitals]
+            ).strip(),
+            district=' '.join(sorted(place for place in places if place)),
+        ))
+    DoctorSearchDocument.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0023_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSearchDocument',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='webapp.doctor')),
+                ('name', models.CharField(max_length=255)),
+                ('specialization', models.CharField(max_length=255)),
+                ('bio', models.TextField(blank=True)),
+                ('hospitals', models.TextField(blank=True)),
+                ('district', models.CharField(blank=True, max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:38
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normalise(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.findall(r'\w+', stripped.lower())
+
+
+def backfill_search_tokens(apps, schema_editor):
+    Patient = apps.get_model('webapp', 'Patient')
+    PatientSearchToken = apps.get_model('webapp', 'PatientSearchToken')
+    PatientSearchToken.objects.bulk_create(
+        [
+            PatientSearchToken(patient_id=patient_id, token=token)
+            for patient_id, first_name, last_name in Patient.objects.values_list('id', 'first_name', 'last_name')
+            for token in set(normalise(f"{first_name} {last_name}"))
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0024_doctorsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='webapp.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'patient'], name='webapp_pati_token_9889a1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('patient', 'token'), name='unique_patient_search_token')],
+            },
+        ),
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
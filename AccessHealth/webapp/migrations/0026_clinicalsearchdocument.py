@@ -0,0 +1,109 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_COLUMNS = 'diagnosis, complaint, body'
+NEW_VALUES = 'new.diagnosis, new.complaint, new.body'
+OLD_VALUES = 'old.diagnosis, old.complaint, old.body'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE webapp_clinicalsearch_fts USING fts5(
+        {FTS_COLUMNS}, content='webapp_clinicalsearchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER webapp_clinicalsearch_ai AFTER INSERT ON webapp_clinicalsearchdocument BEGIN
+        INSERT INTO webapp_clinicalsearch_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER webapp_clinicalsearch_ad AFTER DELETE ON webapp_clinicalsearchdocument BEGIN
+        INSERT INTO webapp_clinicalsearch_fts(webapp_clinicalsearch_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, {OLD_VALUES});
+    END""",
+    f"""CREATE TRIGGER webapp_clinicalsearch_au AFTER UPDATE ON webapp_clinicalsearchdocument BEGIN
+        INSERT INTO webapp_clinicalsearch_fts(webapp_clinicalsearch_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, {OLD_VALUES});
+        INSERT INTO webapp_clinicalsearch_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {NEW_VALUES});
+    END""",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS webapp_clinicalsearch_au",
+    "DROP TRIGGER IF EXISTS webapp_clinicalsearch_ad",
+    "DROP TRIGGER IF EXISTS webapp_clinicalsearch_ai",
+    "DROP TABLE IF EXISTS webapp_clinicalsearch_fts",
+]
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', diagnosis), 'A') || "
+    "setweight(to_tsvector('simple', complaint), 'B') || "
+    "setweight(to_tsvector('simple', body), 'C')"
+)
+POSTGRES_FORWARD = [
+    f"CREATE INDEX webapp_clinicalsearch_vector_idx ON webapp_clinicalsearchdocument USING GIN (({PG_VECTOR}))",
+]
+POSTGRES_BACKWARD = ["DROP INDEX IF EXISTS webapp_clinicalsearch_vector_idx"]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def join_text(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def backfill_search_documents(apps, schema_editor):
+    Consultation = apps.get_model('webapp', 'Consultation')
+    PatientRecord = apps.get_model('webapp', 'PatientRecord')
+    ClinicalSearchDocument = apps.get_model('webapp', 'ClinicalSearchDocument')
+    rows = [
+        ClinicalSearchDocument(
+            source='consultation', source_id=c.pk, patient_id=c.patient_id, doctor_id=c.doctor_id, date=c.date,
+            diagnosis=c.diagnosis or '', complaint=c.chief_complaint or '',
+            body=join_text(c.history, c.examination, c.treatment_plan, c.medications,
+                           c.follow_up_instructions, c.notes),
+        )
+        for c in Consultation.objects.iterator()
+    ]
+    rows += [
+        ClinicalSearchDocument(
+            source='record', source_id=r.pk, patient_id=r.patient_id, doctor_id=r.doctor_id,
+            date=r.created_time.date(), diagnosis=r.diagnosis or '', complaint=r.symptoms or '',
+            body=join_text(r.treatment_plan, r.medicine),
+        )
+        for r in PatientRecord.objects.iterator()
+    ]
+    ClinicalSearchDocument.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0025_patientsearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClinicalSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('consultation', 'Consultation'), ('record', 'Medical record')], max_length=20)),
+                ('source_id', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('diagnosis', models.TextField(blank=True)),
+                ('complaint', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webapp.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clinical_search_documents', to='webapp.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'date'], name='webapp_clin_patient_34a789_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'source_id'), name='unique_clinical_search_source')],
+            },
+        ),
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0026_clinicalsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wearabledevice',
+            name='ingest_token_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
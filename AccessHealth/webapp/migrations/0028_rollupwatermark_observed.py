@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0027_wearabledevice_ingest_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='observed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='observed_reading_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:15
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def delete_duplicate_global_rules(apps, schema_editor):
+    # Keep the newest global rule per reading_type before enforcing uniqueness
+    AlertRule = apps.get_model('webapp', 'AlertRule')
+    duplicated = (
+        AlertRule.objects.filter(patient__isnull=True)
+        .values('reading_type')
+        .annotate(keep=Max('id'), n=Count('id'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for group in duplicated.iterator():
+        AlertRule.objects.filter(
+            patient__isnull=True,
+            reading_type=group['reading_type'],
+        ).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0028_rollupwatermark_observed'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_global_rules, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='alertrule',
+            constraint=models.UniqueConstraint(condition=models.Q(('patient__isnull', True)), fields=('reading_type',), name='unique_global_alert_rule'),
+        ),
+    ]
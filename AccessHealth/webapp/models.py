@@ -77,6 +77,9 @@ class Patient(models.Model):
         return None
     @property
     def last_visit(self):
+        # Lists annotate last_visit_date up front (see views.patients_list)
+        if hasattr(self, 'last_visit_date'):
+            return self.last_visit_date
         # 1. Get appointments linked to this patient
         # 2. Filter only 'completed' appointments (so future bookings don't count)
         # 3. Order by newest date first
@@ -88,6 +91,23 @@ class Patient(models.Model):
         return None
 
 
+class PatientSearchToken(models.Model):
+    """One normalised word of a patient's name, for prefix lookups by webapp.patient_search."""
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'patient']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'token'], name='unique_patient_search_token'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.patient_id}"
+
+
 # Profile for Doctors
 class Doctor(models.Model):
     SPECIALIZATION_CHOICES = [
@@ -170,13 +190,14 @@ class Doctor(models.Model):
         return f"Dr. {self.first_name} {self.last_name}"
     
     def get_avg_rating(self):
-        """Get average rating from reviews"""
-        from django.db.models import Avg
-        return self.reviews.aggregate(avg=Avg('rating'))['avg'] or 0
+        """Get average rating from the maintained DoctorStats row"""
+        stats = getattr(self, 'stats', None)
+        return stats.avg_rating if stats else 0
     
     def get_total_patients(self):
-        """Get count of unique patients"""
-        return self.appointments.values('patient').distinct().count()
+        """Get count of unique patients from the maintained DoctorStats row"""
+        stats = getattr(self, 'stats', None)
+        return stats.total_patients if stats else 0
     
     def get_today_appointments_count(self):
         """Get today's appointments count"""
@@ -185,6 +206,39 @@ class Doctor(models.Model):
         return self.appointments.filter(appointment_date=today).count()
     
 
+class DoctorStats(models.Model):
+    """Denormalised per-doctor counters, refreshed by Review/Appointment signals."""
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    avg_rating = models.FloatField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    total_patients = models.PositiveIntegerField(default=0)
+    completed_appointments = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Doctor stats'
+        indexes = [
+            models.Index(fields=['avg_rating']),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.doctor}"
+
+
+class DoctorSearchDocument(models.Model):
+    """A doctor's searchable text, flattened for the full-text index maintained by webapp.search."""
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=255)
+    specialization = models.CharField(max_length=255)
+    bio = models.TextField(blank=True)
+    hospitals = models.TextField(blank=True)
+    district = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for {self.doctor_id}"
+
+
 class Review(models.Model):
     doctor = models.ForeignKey(
         Doctor,
@@ -224,6 +278,168 @@ class WearableDevice(models.Model):
     alert = models.BooleanField(default=False)
     # allow doctors to access
     authorized_doctors = models.ManyToManyField(Doctor, blank=True, related_name='authorized_devices')
+    # SHA-256 of the device's ingest token (see webapp.ingest_gateway); blank until one is issued
+    ingest_token_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+
+class WearableReading(models.Model):
+    """One sample pushed by a wearable device (append-only time series)."""
+    device = models.ForeignKey(WearableDevice, on_delete=models.CASCADE, related_name='readings')
+    # Denormalised from the device so per-patient range queries skip the join
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='wearable_readings')
+    reading_type = models.CharField(max_length=50)
+    value = models.FloatField()
+    unit = models.CharField(max_length=20, blank=True)
+    timestamp = models.DateTimeField()
+    alert = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['patient', 'reading_type', 'timestamp']),
+            models.Index(fields=['device', 'timestamp']),
+        ]
+        constraints = [
+            # Gateways retry on timeout; a sample is identified by where, what and when
+            models.UniqueConstraint(fields=['device', 'reading_type', 'timestamp'], name='unique_device_reading'),
+        ]
+
+    def __str__(self):
+        return f"{self.device.device_id} {self.reading_type}={self.value} @ {self.timestamp}"
+
+
+class LatestReading(models.Model):
+    """Most recent sample per (patient, reading_type), kept current on ingest."""
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='latest_readings')
+    device = models.ForeignKey(WearableDevice, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reading_type = models.CharField(max_length=50)
+    value = models.FloatField()
+    unit = models.CharField(max_length=20, blank=True)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('patient', 'reading_type')
+
+    def __str__(self):
+        return f"{self.patient} latest {self.reading_type}={self.value}"
+
+
+class ReadingRollup(models.Model):
+    """Windowed aggregate of a patient's readings, built by the rollup_readings command."""
+    RESOLUTION_CHOICES = [
+        ('minute', 'Per minute'),
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='reading_rollups')
+    reading_type = models.CharField(max_length=50)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    min_value = models.FloatField()
+    max_value = models.FloatField()
+    # Sum rather than mean so buckets can be merged without re-reading raw rows
+    sum_value = models.FloatField()
+
+    class Meta:
+        ordering = ['bucket_start']
+        unique_together = ('patient', 'reading_type', 'resolution', 'bucket_start')
+
+    def __str__(self):
+        return f"{self.patient} {self.reading_type} {self.resolution} @ {self.bucket_start}"
+
+    @property
+    def mean_value(self):
+        return self.sum_value / self.count if self.count else None
+
+
+class AlertRule(models.Model):
+    """Allowed range for a reading type. A patient-specific rule overrides the global one."""
+    reading_type = models.CharField(max_length=50)
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='alert_rules',
+        help_text="Leave empty for the default rule applied to every patient",
+    )
+    min_value = models.FloatField(null=True, blank=True)
+    max_value = models.FloatField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        unique_together = ('reading_type', 'patient')
+        constraints = [
+            # NULLs are distinct in unique_together, so global rules need their own constraint
+            models.UniqueConstraint(
+                fields=['reading_type'],
+                condition=models.Q(patient__isnull=True),
+                name='unique_global_alert_rule',
+            ),
+        ]
+
+    def __str__(self):
+        scope = self.patient or "all patients"
+        return f"{self.reading_type} [{self.min_value}, {self.max_value}] for {scope}"
+
+    def is_violated_by(self, value):
+        return (
+            (self.min_value is not None and value < self.min_value)
+            or (self.max_value is not None and value > self.max_value)
+        )
+
+
+class VitalAlert(models.Model):
+    """One out-of-range episode; consecutive violations within the dedup window extend it."""
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='vital_alerts')
+    device = models.ForeignKey(WearableDevice, on_delete=models.SET_NULL, null=True, blank=True, related_name='vital_alerts')
+    reading_type = models.CharField(max_length=50)
+    first_value = models.FloatField()
+    started_at = models.DateTimeField()
+    last_seen_at = models.DateTimeField()
+    reading_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ['-last_seen_at']
+        indexes = [
+            models.Index(fields=['patient', 'reading_type', 'last_seen_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} {self.reading_type} alert since {self.started_at}"
+
+
+class ReadingArchive(models.Model):
+    """Compressed file holding one patient's archived raw readings for one month."""
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='reading_archives')
+    month = models.DateField(help_text="First day of the archived month")
+    path = models.CharField(max_length=255)
+    row_count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['month']
+        unique_together = ('patient', 'month')
+
+    def __str__(self):
+        return f"{self.patient} {self.month:%Y-%m} ({self.row_count} readings)"
+
+
+class RollupWatermark(models.Model):
+    """Highest WearableReading id already folded into each rollup resolution."""
+    resolution = models.CharField(max_length=10, unique=True)
+    last_reading_id = models.BigIntegerField(default=0)
+    # Highest reading id seen at observed_at; folded once it is ROLLUP_SAFETY_LAG old
+    observed_reading_id = models.BigIntegerField(default=0)
+    observed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.resolution} rolled up to #{self.last_reading_id}"
 
 def patient_record_path(instance, filename):
     # stored under MEDIA_ROOT/patient_records/<user_id>/<filename>
@@ -327,9 +543,36 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Notifications'
+        indexes = [
+            models.Index(fields=['doctor', 'is_read']),
+            models.Index(fields=['patient', 'is_read']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.doctor.user.username}"
+
+
+class NotificationCounter(models.Model):
+    """Unread notification count of one doctor or one patient, kept in step by webapp.notifications."""
+    doctor = models.OneToOneField(
+        'Doctor', on_delete=models.CASCADE, null=True, blank=True, related_name='notification_counter'
+    )
+    patient = models.OneToOneField(
+        'Patient', on_delete=models.CASCADE, null=True, blank=True, related_name='notification_counter'
+    )
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(doctor__isnull=True) ^ models.Q(patient__isnull=True),
+                name='notification_counter_one_recipient',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor or self.patient}: {self.unread} unread"
     
 
 # models.py
@@ -420,7 +663,34 @@ class Consultation(models.Model):
             'pending': 'status-pending',
             'cancelled': 'status-cancelled',
         }.get(self.status, 'status-pending')
-        
+
+
+class ClinicalSearchDocument(models.Model):
+    """The clinical text of one consultation or medical record, for the full-text index in webapp.clinical_search."""
+    SOURCE_CHOICES = [
+        ('consultation', 'Consultation'),
+        ('record', 'Medical record'),
+    ]
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.PositiveIntegerField()
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='clinical_search_documents')
+    doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    date = models.DateField()
+    diagnosis = models.TextField(blank=True)
+    complaint = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'source_id'], name='unique_clinical_search_source'),
+        ]
+
+    def __str__(self):
+        return f"Search document for {self.source} {self.source_id}"
+
 
 class PatientNotificationPreference(models.Model):
     patient = models.OneToOneField(
@@ -0,0 +1,97 @@
+"""
+Maintenance of the per-recipient unread notification counters.
+
+Every page header shows an unread badge, so the count is stored in
+NotificationCounter rather than counted per render. Single saves and
+deletes are picked up by receivers in ``signals.py``; code that writes
+notifications in bulk calls ``refresh_unread_counts`` itself, and
+``rebuild_notification_counters`` recomputes every row.
+"""
+from django.db.models import Count
+
+from .fragments import bump_versions
+from .models import Doctor, Notification, NotificationCounter, Patient
+
+
+def count_unread(field, ids):
+    """{recipient_id: unread count} for ``field`` ('doctor' or 'patient'); zero counts are omitted."""
+    return dict(
+        Notification.objects.filter(**{f'{field}_id__in': ids}, is_read=False)
+        .order_by().values_list(f'{field}_id').annotate(unread=Count('id'))
+    )
+
+
+def store_counts(field, ids, counts):
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(**{f'{field}_id': pk}, unread=counts.get(pk, 0)) for pk in ids],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=[field],
+        update_fields=['unread', 'updated_at'],
+    )
+
+
+def refresh_unread_counts(doctor_ids=(), patient_ids=(), create=True):
+    """
+    Recount unread notifications for the given doctors and patients and store the totals.
+
+    With ``create=False`` only existing counters are updated; deletions use
+    this so that cascading deletes of a recipient don't recreate its row.
+    Cached notification panels of the same recipients are invalidated too.
+    """
+    bump_versions('notifications', doctor_ids, patient_ids)
+    for field, ids in (('doctor', doctor_ids), ('patient', patient_ids)):
+        ids = {pk for pk in ids if pk is not None}
+        if not ids:
+            continue
+        counts = count_unread(field, ids)
+        if create:
+            store_counts(field, ids, counts)
+        else:
+            for pk in ids:
+                NotificationCounter.objects.filter(**{f'{field}_id': pk}).update(unread=counts.get(pk, 0))
+
+
+def rebuild_notification_counters():
+    """Recompute the counter of every doctor and patient; returns rows written."""
+    written = 0
+    for field, model in (('doctor', Doctor), ('patient', Patient)):
+        ids = list(model.objects.values_list('id', flat=True))
+        counts = dict(
+            Notification.objects.filter(is_read=False, **{f'{field}__isnull': False})
+            .order_by().values_list(f'{field}_id').annotate(unread=Count('id'))
+        )
+        store_counts(field, ids, counts)
+        written += len(ids)
+    return written
+
+
+def unread_count(doctor=None, patient=None):
+    """Stored unread count for a doctor or a patient: one indexed single-row read."""
+    recipient = {'doctor': doctor} if doctor is not None else {'patient': patient}
+    return NotificationCounter.objects.filter(**recipient).values_list('unread', flat=True).first() or 0
+
+
+def recipient_of(profile):
+    """``{'doctor': ...}`` or ``{'patient': ...}`` for a request's profile, or None if it has neither."""
+    if profile.doctor is not None:
+        return {'doctor': profile.doctor}
+    if profile.patient is not None:
+        return {'patient': profile.patient}
+    return None
+
+
+def mark_all_read(doctor):
+    """
+    Mark every unread notification addressed to ``doctor`` as read in one UPDATE.
+
+    Notifications are addressed to doctors; ``Notification.patient`` is only
+    the subject, so there is no patient counterpart. The doctor's counter is
+    recounted along with those of the patients the notifications were about.
+    Returns the number of notifications marked.
+    """
+    unread = Notification.objects.filter(doctor=doctor, is_read=False)
+    affected = set(unread.order_by().values_list('patient_id', flat=True).distinct())
+    marked = unread.update(is_read=True)
+    refresh_unread_counts(doctor_ids=[doctor.pk], patient_ids=affected)
+    return marked
@@ -0,0 +1,134 @@
+"""
+Patient lookup by national ID prefix and partial names.
+
+Each patient's names are split into normalised tokens (lower case, accents
+stripped) stored in PatientSearchToken, indexed on (token, patient). A
+prefix lookup is a range scan on that index, and a national ID prefix
+is a range scan on the unique index of ``patient_national_id``; neither
+needs a LIKE scan over the patients table. Tokens are kept in step by the
+Patient receiver in ``signals.py``; ``rebuild_patient_search`` rebuilds
+them all. Restricting to a doctor's patients is a join on ``Patient.doctors``,
+never a list of ids, so it stays one query however many patients they have.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Patient, PatientSearchToken
+
+# Upper bound for prefix ranges: sorts after every character a token can contain
+PREFIX_END = '\U0010ffff'
+DEFAULT_RESULT_LIMIT = 20
+# Score contributions; every query term has to match for a patient to be returned
+SCORE_NID_EXACT = 100
+SCORE_NID_PREFIX = 50
+SCORE_TOKEN_EXACT = 10
+SCORE_TOKEN_PREFIX = 5
+
+
+def normalise(text):
+    """Lower-case word tokens of ``text`` with accents removed."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.findall(r'\w+', stripped.lower())
+
+
+def name_tokens(patient):
+    return set(normalise(f"{patient.first_name} {patient.last_name}"))
+
+
+def index_patient(patient):
+    """Bring one patient's tokens in line with their current names."""
+    wanted = name_tokens(patient)
+    existing = set(PatientSearchToken.objects.filter(patient=patient).values_list('token', flat=True))
+    if wanted == existing:
+        return
+    with transaction.atomic():
+        PatientSearchToken.objects.filter(patient=patient, token__in=existing - wanted).delete()
+        PatientSearchToken.objects.bulk_create(
+            [PatientSearchToken(patient=patient, token=token) for token in wanted - existing],
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_patient_search():
+    """Rebuild every patient's tokens; returns the number of tokens written."""
+    with transaction.atomic():
+        PatientSearchToken.objects.all().delete()
+        tokens = [
+            PatientSearchToken(patient_id=patient_id, token=token)
+            for patient_id, first_name, last_name in
+            Patient.objects.values_list('id', 'first_name', 'last_name').iterator()
+            for token in set(normalise(f"{first_name} {last_name}"))
+        ]
+        PatientSearchToken.objects.bulk_create(tokens, batch_size=1000)
+    return len(tokens)
+
+
+def national_id_prefix(text):
+    """The query as a national ID prefix, or None if it can't be one."""
+    compact = re.sub(r'[\s-]', '', text)
+    return compact if compact.isdigit() else None
+
+
+def token_prefix(term):
+    return {'token__gte': term, 'token__lt': term + PREFIX_END}
+
+
+def has_token_prefix(term, patient_ref):
+    return Exists(PatientSearchToken.objects.filter(patient_id=OuterRef(patient_ref), **token_prefix(term)))
+
+
+def matching_patients(text, patients):
+    """``patients`` narrowed to the ones ``search_patients`` would match, unranked."""
+    prefix = national_id_prefix(text)
+    if prefix:
+        return patients.filter(patient_national_id__gte=prefix, patient_national_id__lt=prefix + PREFIX_END)
+    terms = normalise(text)
+    if not terms:
+        return patients.none()
+    return patients.filter(*(has_token_prefix(term, 'pk') for term in terms))
+
+
+def search_patients(text, doctor=None, limit=DEFAULT_RESULT_LIMIT):
+    """
+    ``[(patient_id, score)]`` best first, restricted to the patients ``doctor`` treats when given.
+
+    A numeric query is matched as a national ID prefix; otherwise each word
+    must prefix-match one of the patient's name tokens, exact words scoring
+    higher. Ties are broken by patient id for a stable order. ``limit=None``
+    returns every match.
+    """
+    scores = {}
+
+    prefix = national_id_prefix(text)
+    if prefix:
+        patients = matching_patients(text, Patient.objects.all())
+        if doctor is not None:
+            patients = patients.filter(doctors=doctor)
+        for patient_id, national_id in patients.values_list('id', 'patient_national_id'):
+            scores[patient_id] = SCORE_NID_EXACT if national_id == prefix else SCORE_NID_PREFIX
+    else:
+        terms = normalise(text)
+        for position, term in enumerate(terms):
+            matches = PatientSearchToken.objects.filter(**token_prefix(term))
+            if doctor is not None:
+                matches = matches.filter(patient__doctors=doctor)
+            # Later terms only need checking against patients every earlier term matched
+            matches = matches.filter(*(has_token_prefix(earlier, 'patient_id') for earlier in terms[:position]))
+            term_scores = {}
+            for patient_id, token in matches.values_list('patient_id', 'token'):
+                score = SCORE_TOKEN_EXACT if token == term else SCORE_TOKEN_PREFIX
+                term_scores[patient_id] = max(term_scores.get(patient_id, 0), score)
+            scores = {
+                patient_id: score + (scores.get(patient_id, 0) if position else 0)
+                for patient_id, score in term_scores.items()
+                if not position or patient_id in scores
+            }
+            if not scores:
+                break
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return ranked if limit is None else ranked[:max(limit, 0)]
@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .archive import read_entry
+from .models import ReadingArchive, ReadingRollup, RollupWatermark, WearableReading
+
+RESOLUTIONS = [choice for choice, _ in ReadingRollup.RESOLUTION_CHOICES]
+# Raw reading ids folded per transaction, bounds memory on large backlogs
+ROLLUP_CHUNK_SIZE = 50000
+# Ids are handed out at INSERT but can commit out of order. Only ids seen at least
+# this long ago are folded; any transaction that held a lower id has finished by then.
+ROLLUP_SAFETY_LAG = timedelta(minutes=1)
+UPSERT_BATCH_SIZE = 500
+
+
+def aggregate_readings(readings, resolution):
+    """
+    Aggregate a WearableReading queryset into unsaved ReadingRollup rows.
+
+    The grouping and min/max/sum/count run inside the database as a single
+    GROUP BY over the truncated timestamp, so no raw row is materialised
+    in Python.
+    """
+    grouped = (
+        readings.order_by()
+        .annotate(bucket=Trunc('timestamp', resolution))
+        .values('patient_id', 'reading_type', 'bucket')
+        .annotate(
+            n=Count('id'),
+            low=Min('value'),
+            high=Max('value'),
+            total=Sum('value'),
+        )
+    )
+    return [
+        ReadingRollup(
+            patient_id=row['patient_id'],
+            reading_type=row['reading_type'],
+            resolution=resolution,
+            bucket_start=row['bucket'],
+            count=row['n'],
+            min_value=row['low'],
+            max_value=row['high'],
+            sum_value=row['total'],
+        )
+        for row in grouped
+    ]
+
+
+def bucket_start(timestamp, resolution):
+    """``timestamp`` truncated to ``resolution`` in the current timezone, as ``Trunc`` does."""
+    # Leading (year, month, day, hour, minute) fields each resolution keeps
+    kept = {'minute': 5, 'hour': 4, 'day': 3}[resolution]
+    return timezone.make_aware(datetime(*timezone.localtime(timestamp).timetuple()[:kept]))
+
+
+def archived_rollups(entry, resolution):
+    """Aggregate the readings of one archive file into unsaved ReadingRollup rows."""
+    buckets = {}
+    for _, reading_type, value, _, timestamp, _ in read_entry(entry):
+        key = (reading_type, bucket_start(timestamp, resolution))
+        rollup = buckets.get(key)
+        if rollup is None:
+            buckets[key] = ReadingRollup(
+                patient_id=entry.patient_id,
+                reading_type=reading_type,
+                resolution=resolution,
+                bucket_start=key[1],
+                count=1,
+                min_value=value,
+                max_value=value,
+                sum_value=value,
+            )
+        else:
+            rollup.count += 1
+            rollup.sum_value += value
+            rollup.min_value = min(rollup.min_value, value)
+            rollup.max_value = max(rollup.max_value, value)
+    return list(buckets.values())
+
+
+def merge_rollups(resolution, fresh):
+    """Add freshly aggregated buckets onto any stored ones and upsert the result."""
+    if not fresh:
+        return
+    starts = [r.bucket_start for r in fresh]
+    stored = {
+        (r.patient_id, r.reading_type, r.bucket_start): r
+        for r in ReadingRollup.objects.filter(
+            resolution=resolution,
+            patient_id__in={r.patient_id for r in fresh},
+            reading_type__in={r.reading_type for r in fresh},
+            bucket_start__gte=min(starts),
+            bucket_start__lte=max(starts),
+        )
+    }
+    for rollup in fresh:
+        old = stored.get((rollup.patient_id, rollup.reading_type, rollup.bucket_start))
+        if old is not None:
+            rollup.count += old.count
+            rollup.sum_value += old.sum_value
+            rollup.min_value = min(rollup.min_value, old.min_value)
+            rollup.max_value = max(rollup.max_value, old.max_value)
+    ReadingRollup.objects.bulk_create(
+        fresh,
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['patient', 'reading_type', 'resolution', 'bucket_start'],
+        update_fields=['count', 'min_value', 'max_value', 'sum_value'],
+    )
+
+
+def safe_reading_id(resolution):
+    """
+    Highest reading id that can be folded into ``resolution`` without skipping any.
+
+    Each call records the current highest id; it becomes foldable on the
+    first call at least ``ROLLUP_SAFETY_LAG`` later, so readings are folded
+    one run after they are first seen.
+    """
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(resolution=resolution)
+        safe = watermark.last_reading_id
+        now = timezone.now()
+        if watermark.observed_at is None or watermark.observed_at <= now - ROLLUP_SAFETY_LAG:
+            if watermark.observed_at is not None:
+                safe = max(safe, watermark.observed_reading_id)
+            watermark.observed_reading_id = WearableReading.objects.aggregate(m=Max('id'))['m'] or 0
+            watermark.observed_at = now
+            watermark.save(update_fields=['observed_reading_id', 'observed_at', 'updated_at'])
+    return safe
+
+
+def fold_readings(resolution, high):
+    """Fold readings above the watermark and up to id ``high`` into ``resolution``, in chunks."""
+    folded = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(resolution=resolution)
+            low = watermark.last_reading_id
+            if low >= high:
+                return folded
+            upper = min(high, low + ROLLUP_CHUNK_SIZE)
+            fresh = aggregate_readings(WearableReading.objects.filter(id__gt=low, id__lte=upper), resolution)
+            folded += sum(rollup.count for rollup in fresh)
+            merge_rollups(resolution, fresh)
+            watermark.last_reading_id = upper
+            watermark.save(update_fields=['last_reading_id', 'updated_at'])
+
+
+def update_rollups(resolution):
+    """
+    Incrementally fold readings ingested since the last run into ``resolution``.
+
+    Progress is tracked by reading id (not timestamp) so late uploads for
+    old windows are still picked up, and only up to ``safe_reading_id`` so
+    a reading committed after a higher id is not skipped. Returns the
+    number of readings folded.
+    """
+    return fold_readings(resolution, safe_reading_id(resolution))
+
+
+def rebuild_rollups(resolution):
+    """
+    Discard ``resolution`` rollups and recompute them from every reading.
+
+    Archived readings are no longer in the hot table, so their files are
+    folded back in first; the hot table is then folded up to the old
+    watermark, or further if ``safe_reading_id`` allows. Returns the number
+    of readings folded.
+    """
+    folded = 0
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(resolution=resolution)
+        previous = watermark.last_reading_id
+        ReadingRollup.objects.filter(resolution=resolution).delete()
+        watermark.last_reading_id = 0
+        watermark.save(update_fields=['last_reading_id', 'updated_at'])
+        for entry in ReadingArchive.objects.order_by('pk').iterator():
+            fresh = archived_rollups(entry, resolution)
+            folded += sum(rollup.count for rollup in fresh)
+            merge_rollups(resolution, fresh)
+    return folded + fold_readings(resolution, max(previous, safe_reading_id(resolution)))
@@ -0,0 +1,140 @@
+"""
+Full-text search over doctors.
+
+Each doctor's searchable text (name, specialization, bio, hospitals and
+districts) is flattened into a DoctorSearchDocument row. The database
+indexes those rows: an FTS5 external-content table kept in step by
+triggers on SQLite, a GIN index over a weighted tsvector on PostgreSQL
+(both created in migration 0024). Receivers in ``signals.py`` re-index a
+doctor when they or their hospitals change; ``rebuild_doctor_search``
+re-indexes everyone.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+from .models import Doctor, DoctorSearchDocument
+
+FTS_TABLE = 'webapp_doctorsearch_fts'
+# bm25 column weights, in FTS column order: name, specialization, bio, hospitals, district
+FTS_WEIGHTS = (10.0, 5.0, 1.0, 3.0, 3.0)
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', specialization), 'B') || "
+    "setweight(to_tsvector('simple', hospitals), 'C') || "
+    "setweight(to_tsvector('simple', district), 'C') || "
+    "setweight(to_tsvector('simple', bio), 'D')"
+)
+SEARCH_RESULT_LIMIT = 1000
+
+
+def build_document(doctor):
+    """Unsaved DoctorSearchDocument for ``doctor``; expects ``doctor.hospitals`` to be prefetched or cheap."""
+    hospitals = list(doctor.hospitals.all())
+    places = {doctor.primary_practice_district, doctor.district, doctor.sector}
+    places.update(hospital.district for hospital in hospitals)
+    return DoctorSearchDocument(
+        doctor=doctor,
+        name=f"{doctor.first_name} {doctor.last_name}",
+        specialization=f"{doctor.specialization} {doctor.get_specialization_display()}",
+        bio=doctor.professional_bio or '',
+        hospitals=' '.join(
+            [doctor.hospital_or_clinic_affiliation or ''] + [hospital.name for hospital in hospitals]
+        ).strip(),
+        district=' '.join(sorted(place for place in places if place)),
+    )
+
+
+def save_documents(documents):
+    DoctorSearchDocument.objects.bulk_create(
+        documents,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['doctor'],
+        update_fields=['name', 'specialization', 'bio', 'hospitals', 'district', 'updated_at'],
+    )
+
+
+def index_doctors(doctor_ids):
+    """Re-index the given doctors (two queries regardless of how many)."""
+    doctors = Doctor.objects.filter(pk__in=set(doctor_ids)).prefetch_related('hospitals')
+    save_documents([build_document(doctor) for doctor in doctors])
+
+
+def rebuild_doctor_search():
+    """Re-index every doctor; returns documents written."""
+    written = 0
+    doctor_ids = list(Doctor.objects.values_list('pk', flat=True))
+    for start in range(0, len(doctor_ids), 500):
+        chunk = doctor_ids[start:start + 500]
+        index_doctors(chunk)
+        written += len(chunk)
+    return written
+
+
+def query_terms(text):
+    """Lower-cased word tokens of a user query; punctuation never reaches the query syntax."""
+    return re.findall(r'\w+', text.lower())
+
+
+def search_doctor_ids(text, limit=SEARCH_RESULT_LIMIT):
+    """
+    Ids of doctors matching every word of ``text`` as a prefix, best match first.
+
+    Returns None where the database has no full-text index, so callers can
+    fall back to plain filtering.
+    """
+    terms = query_terms(text)
+    if not terms:
+        return []
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        sql = (
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s"
+        )
+        params = [match, limit]
+    elif connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        sql = (
+            f"SELECT doctor_id FROM {DoctorSearchDocument._meta.db_table} "
+            f"WHERE ({PG_VECTOR}) @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(({PG_VECTOR}), to_tsquery('simple', %s)) DESC LIMIT %s"
+        )
+        params = [tsquery, tsquery, limit]
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_doctors(doctors, text):
+    """
+    ``(doctors, matched_ids)`` narrowed to the search ``text``.
+
+    ``matched_ids`` is the ranked id list, or None when the text is blank
+    or the database has no full-text index (then names and specialization
+    are matched with ``icontains``).
+    """
+    if not text:
+        return doctors, None
+    matched_ids = search_doctor_ids(text)
+    if matched_ids is not None:
+        return doctors.filter(pk__in=matched_ids), matched_ids
+    return doctors.filter(
+        Q(first_name__icontains=text) |
+        Q(last_name__icontains=text) |
+        Q(specialization__icontains=text)
+    ), None
+
+
+def relevance_order(doctor_ids):
+    """Expression ordering rows by their position in ``doctor_ids``."""
+    return Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(doctor_ids)],
+        default=len(doctor_ids),
+        output_field=IntegerField(),
+    )
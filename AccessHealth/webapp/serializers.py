@@ -3,8 +3,10 @@ from django.contrib.auth import get_user_model
 from .models import (
     Hospital, DoctorHospital, Patient, Doctor, Review, 
     WearableDevice, PatientRecord, Appointment, Notification, 
-    Consultation, PatientNotificationPreference
+    Consultation, PatientNotificationPreference, WearableReading,
+    ReadingRollup
 )
+from .wearables import MAX_BULK_READINGS
 
 User = get_user_model()
 
@@ -49,7 +51,8 @@ class PatientSerializer(serializers.ModelSerializer):
 class DoctorSerializer(serializers.ModelSerializer):
     user_info = UserSerializer(source='user', read_only=True)
     full_name = serializers.ReadOnlyField()
-    avg_rating = serializers.FloatField(source='get_avg_rating', read_only=True)
+    avg_rating = serializers.FloatField(source='stats.avg_rating', read_only=True, default=0)
+    review_count = serializers.IntegerField(source='stats.review_count', read_only=True, default=0)
     
     class Meta:
         model = Doctor
@@ -70,6 +73,29 @@ class WearableDeviceSerializer(serializers.ModelSerializer):
         model = WearableDevice
         fields = '__all__'
 
+class WearableReadingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WearableReading
+        fields = '__all__'
+        read_only_fields = ['device', 'patient']
+
+class WearableReadingSampleSerializer(serializers.Serializer):
+    # Plain Serializer (no model validators) so thousands of samples validate cheaply
+    reading_type = serializers.CharField(max_length=50)
+    value = serializers.FloatField()
+    unit = serializers.CharField(max_length=20, required=False, allow_blank=True, default='')
+    timestamp = serializers.DateTimeField(required=False)
+
+class WearableReadingBulkSerializer(serializers.Serializer):
+    readings = WearableReadingSampleSerializer(many=True, allow_empty=False, max_length=MAX_BULK_READINGS)
+
+class ReadingRollupSerializer(serializers.ModelSerializer):
+    mean_value = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ReadingRollup
+        fields = ['reading_type', 'resolution', 'bucket_start', 'count', 'min_value', 'max_value', 'mean_value']
+
 class PatientRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = PatientRecord
@@ -0,0 +1,217 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .access import invalidate_doctor_access
+from .clinical_search import index_consultation, index_record, unindex
+from .doctor_stats import refresh_doctor_stats
+from .facets import invalidate_doctor_facets
+from .fragments import bump_versions
+from .metrics import invalidate_doctor_metrics
+from .models import (
+    Appointment, Consultation, Doctor, DoctorHospital, DoctorStats, Hospital, Notification, Patient, PatientRecord,
+    Review, WearableDevice,
+)
+from .notifications import refresh_unread_counts
+from .patient_search import index_patient
+from .search import index_doctors
+from .typeahead import index_doctor, index_hospital, unindex_doctor, unindex_hospital
+from .wearables import record_device_reading
+
+
+def doctors_of_device(device):
+    return set(device.authorized_doctors.values_list('id', flat=True)) | set(
+        Patient.doctors.through.objects.filter(patient_id=device.patient_id).values_list('doctor_id', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=WearableDevice.authorized_doctors.through)
+@receiver(m2m_changed, sender=Patient.doctors.through)
+def doctor_access_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # instance is the Doctor whose devices/patients changed
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_doctor_access([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_doctor_access(pk_set)
+    elif action == 'pre_clear':
+        related = instance.authorized_doctors if isinstance(instance, WearableDevice) else instance.doctors
+        invalidate_doctor_access(list(related.values_list('id', flat=True)))
+
+
+@receiver(post_save, sender=WearableDevice)
+@receiver(pre_delete, sender=WearableDevice)
+def device_access_changed(sender, instance, **kwargs):
+    # A new, moved or removed device changes the device set of everyone treating its patient
+    invalidate_doctor_access(doctors_of_device(instance))
+    bump_versions('devices', patient_ids=[instance.patient_id])
+
+
+@receiver(pre_save, sender=WearableDevice)
+def device_moving(sender, instance, **kwargs):
+    # Reassigning a device to another patient must also revoke it from the old patient's doctors
+    instance._previous_reading = None
+    if instance.pk:
+        previous = WearableDevice.objects.filter(pk=instance.pk).only('id', 'patient_id', 'value_of_reading').first()
+        if previous is not None:
+            instance._previous_reading = previous.value_of_reading
+        if previous is not None and previous.patient_id != instance.patient_id:
+            invalidate_doctor_access(doctors_of_device(previous))
+            bump_versions('devices', patient_ids=[previous.patient_id])
+
+
+@receiver(post_save, sender=WearableDevice)
+def device_reading_set(sender, instance, created, raw=False, **kwargs):
+    # A value written on the device itself (legacy create/update, admin) is a reading like any upload
+    if raw or instance.value_of_reading is None:
+        return
+    if created or instance.value_of_reading != getattr(instance, '_previous_reading', None):
+        record_device_reading(instance)
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_save, sender=Review)
+def doctor_metrics_moving(sender, instance, **kwargs):
+    # Remember the stored doctor and patient so a reassignment also refreshes the previous ones
+    instance._previous_owner = None
+    if instance.pk:
+        instance._previous_owner = (
+            sender.objects.filter(pk=instance.pk).values_list('doctor_id', 'patient_id').first()
+        )
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def doctor_metrics_changed(sender, instance, created=None, **kwargs):
+    previous_doctor_id, previous_patient_id = (
+        getattr(instance, '_previous_owner', None) or (instance.doctor_id, instance.patient_id)
+    )
+    instance._previous_owner = None
+    doctor_ids = {instance.doctor_id, previous_doctor_id}
+    for doctor_id in doctor_ids:
+        # post_delete passes no ``created``; a doctor's cascade must not re-insert their stats row
+        refresh_doctor_stats(doctor_id, create=created is not None)
+        invalidate_doctor_metrics(doctor_id)
+    if sender is Appointment:
+        bump_versions('appointments', doctor_ids, {instance.patient_id, previous_patient_id})
+    else:
+        bump_versions('reviews', doctor_ids)
+
+
+@receiver(post_save, sender=Consultation)
+@receiver(post_delete, sender=Consultation)
+def consultation_changed(sender, instance, **kwargs):
+    bump_versions('consultations', [instance.doctor_id], [instance.patient_id])
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_created(sender, instance, created, **kwargs):
+    if created:
+        DoctorStats.objects.get_or_create(doctor=instance)
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, **kwargs):
+    refresh_unread_counts([instance.doctor_id], [instance.patient_id])
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    refresh_unread_counts([instance.doctor_id], [instance.patient_id], create=False)
+
+
+def reindex_doctors_on_commit(doctor_ids):
+    # After commit, so a doctor deleted in the same transaction is simply skipped
+    doctor_ids = set(doctor_ids)
+    if doctor_ids:
+        transaction.on_commit(lambda: index_doctors(doctor_ids))
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved(sender, instance, **kwargs):
+    reindex_doctors_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=DoctorHospital)
+@receiver(post_delete, sender=DoctorHospital)
+def doctor_hospital_changed(sender, instance, **kwargs):
+    reindex_doctors_on_commit([instance.doctor_id])
+
+
+@receiver(m2m_changed, sender=Doctor.hospitals.through)
+def doctor_hospitals_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            reindex_doctors_on_commit([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        reindex_doctors_on_commit(pk_set)
+    elif action == 'pre_clear':
+        reindex_doctors_on_commit(instance.doctors.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved(sender, instance, created, **kwargs):
+    if not created:
+        reindex_doctors_on_commit(instance.hospital_doctors.values_list('doctor_id', flat=True))
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, **kwargs):
+    index_patient(instance)
+
+
+@receiver(post_save, sender=Consultation)
+def consultation_saved(sender, instance, **kwargs):
+    index_consultation(instance)
+
+
+@receiver(post_delete, sender=Consultation)
+def consultation_deleted(sender, instance, **kwargs):
+    unindex('consultation', instance.pk)
+
+
+@receiver(post_save, sender=PatientRecord)
+def patient_record_saved(sender, instance, **kwargs):
+    index_record(instance)
+
+
+@receiver(post_delete, sender=PatientRecord)
+def patient_record_deleted(sender, instance, **kwargs):
+    unindex('record', instance.pk)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=DoctorHospital)
+@receiver(post_delete, sender=DoctorHospital)
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+@receiver(m2m_changed, sender=Doctor.hospitals.through)
+def doctor_facets_changed(sender, action=None, **kwargs):
+    # m2m_changed fires in pre_/post_ pairs; the other signals carry no action
+    if action is None or action.startswith('post_'):
+        invalidate_doctor_facets()
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_typeahead_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: index_doctor(instance))
+
+
+@receiver(post_delete, sender=Doctor)
+def doctor_typeahead_deleted(sender, instance, **kwargs):
+    doctor_id = instance.pk  # Django clears the pk once the delete finishes
+    transaction.on_commit(lambda: unindex_doctor(doctor_id))
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_typeahead_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: index_hospital(instance))
+
+
+@receiver(post_delete, sender=Hospital)
+def hospital_typeahead_deleted(sender, instance, **kwargs):
+    hospital_id = instance.pk
+    transaction.on_commit(lambda: unindex_hospital(hospital_id))
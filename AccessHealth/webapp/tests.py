@@ -1,3 +1,407 @@
-from django.test import TestCase
+import threading
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import rollups, typeahead, wearables
+from .keyset import keyset_page
+from .models import (
+    AlertRule, Appointment, Doctor, DoctorStats, LatestReading, Patient, ReadingRollup, Review, RollupWatermark,
+    VitalAlert, WearableDevice, WearableReading,
+)
+from .patient_search import search_patients
+
+
+def make_doctor(n):
+    user = User.objects.create_user(f'doctor{n}', f'doctor{n}@example.com', 'pw')
+    return Doctor.objects.create(
+        user=user, doctor_licence_number=f'LIC-{n}', first_name='Ada', last_name=f'Mugisha{n}',
+        dob=date(1980, 1, 1), gender='F', primary_practice_district='Gasabo',
+        phone_number='0780000000', specialization='GENERAL', years_of_experience=5,
+    )
+
+
+def make_patient(n):
+    user = User.objects.create_user(f'patient{n}', f'patient{n}@example.com', 'pw')
+    return Patient.objects.create(
+        user=user, patient_national_id=f'1199{n:012d}', first_name='Patient', last_name=f'No{n}',
+        dob=date(1990, 1, 1), gender='F', district='Gasabo', sector='Remera', phone_number='0780000001',
+    )
+
+
+class PatientsListQueryTests(TestCase):
+    """The doctor's patient list must not query per row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('doctor', 'doctor@example.com', 'pw')
+        cls.doctor = Doctor.objects.create(
+            user=user, doctor_licence_number='LIC-1', first_name='Ada', last_name='Mugisha',
+            dob=date(1980, 1, 1), gender='F', primary_practice_district='Gasabo',
+            phone_number='0780000000', specialization='GENERAL', years_of_experience=5,
+        )
+
+    def add_patients(self, count):
+        for i in range(Patient.objects.count(), Patient.objects.count() + count):
+            user = User.objects.create_user(f'patient{i}', f'patient{i}@example.com', 'pw')
+            patient = Patient.objects.create(
+                user=user, patient_national_id=f'1199{i:012d}', first_name='Patient', last_name=f'No{i}',
+                dob=date(1990, 1, 1), gender='F', district='Gasabo', sector='Remera', phone_number='0780000001',
+            )
+            patient.doctors.add(self.doctor)
+            for day, status in ((1, 'completed'), (5, 'completed'), (9, 'pending')):
+                Appointment.objects.create(
+                    doctor=self.doctor, patient=patient, appointment_date=date(2024, 3, day),
+                    appointment_time=time(9), appointment_type='consultation', status=status,
+                )
+
+    def get_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('patients_list'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_patients(self):
+        self.client.force_login(self.doctor.user)
+        self.add_patients(2)
+        self.get_page()  # the first request also records the profile in the session
+        _, small = self.get_page()
+        self.add_patients(8)
+        response, full = self.get_page()
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertEqual(small, full)
+
+    def test_last_visit_is_latest_completed_appointment(self):
+        self.client.force_login(self.doctor.user)
+        self.add_patients(1)
+        response, _ = self.get_page()
+        patient = response.context['page_obj'][0]
+        self.assertEqual(patient.last_visit, date(2024, 3, 5))
+        self.assertEqual(patient.visit_count, 2)
+
+
+class DoctorStatsTests(TestCase):
+    """DoctorStats follows appointments and reviews, including moves and cascades."""
+
+    def setUp(self):
+        self.doctor = make_doctor(1)
+        self.patient = make_patient(1)
+        self.appointment = Appointment.objects.create(
+            doctor=self.doctor, patient=self.patient, appointment_date=date(2024, 3, 1),
+            appointment_time=time(9), appointment_type='consultation', status='completed',
+        )
+        Review.objects.create(doctor=self.doctor, patient=self.patient, rating=4)
+
+    def test_deleting_doctor_with_appointments_and_reviews(self):
+        self.doctor.delete()
+        self.assertFalse(Doctor.objects.exists())
+        self.assertFalse(DoctorStats.objects.exists())
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_moving_appointment_refreshes_both_doctors(self):
+        other = make_doctor(2)
+        self.appointment.doctor = other
+        self.appointment.save()
+        self.assertEqual(DoctorStats.objects.get(doctor=self.doctor).completed_appointments, 0)
+        self.assertEqual(DoctorStats.objects.get(doctor=other).completed_appointments, 1)
+
+
+class IngestReadingsTests(TestCase):
+    """Re-sent samples are neither counted nor passed on to the latest-reading store or alerts."""
+
+    start = datetime(2024, 3, 1, 8, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.patient = make_patient(1)
+        self.device = WearableDevice.objects.create(
+            patient=self.patient, device_id='watch-1', device_type='Smartwatch', model='W1',
+            reading_type='heart_rate', unit='bpm',
+        )
+        AlertRule.objects.create(reading_type='heart_rate', max_value=100)
+        # Forget keys between calls, as another process would
+        self.addCleanup(wearables.recent_reading_keys.clear)
+
+    def samples(self, *values, offset=0):
+        return [
+            {'reading_type': 'heart_rate', 'value': value, 'timestamp': self.start + timedelta(minutes=offset + i)}
+            for i, value in enumerate(values)
+        ]
+
+    def test_stored_duplicates_are_not_created_again(self):
+        self.assertEqual(len(wearables.ingest_readings(self.device, self.samples(70, 150, 80))), 3)
+        wearables.recent_reading_keys.clear()
+        created = wearables.ingest_readings(self.device, self.samples(70, 150, 80) + self.samples(90, offset=3))
+        self.assertEqual([reading.value for reading in created], [90])
+        self.assertEqual(WearableReading.objects.count(), 4)
+        self.assertEqual(VitalAlert.objects.get().reading_count, 1)
+
+    def test_resent_older_sample_does_not_replace_latest(self):
+        wearables.ingest_readings(self.device, self.samples(70, 80))
+        wearables.recent_reading_keys.clear()
+        self.assertEqual(wearables.ingest_readings(self.device, self.samples(70)), [])
+        self.assertEqual(LatestReading.objects.get().value, 80)
+
+
+class TypeaheadTests(TestCase):
+    """A writer applies its own change in place instead of rebuilding on the next request."""
+
+    def setUp(self):
+        patcher = mock.patch.object(typeahead, '_index', typeahead.TypeaheadIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.doctor = make_doctor(1)
+        typeahead.get_index()
+
+    def labels(self, text):
+        return [label for _, _, label in typeahead.get_index().lookup(text)]
+
+    def test_own_change_keeps_index_current(self):
+        self.doctor.last_name = 'Uwase'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.save()
+        self.assertEqual(typeahead._index.version, typeahead.shared_version())
+        with mock.patch.object(typeahead, 'directory_sources') as sources:
+            self.assertEqual(self.labels('uwa'), ['Ada Uwase'])
+            typeahead._index.checked_at = 0
+            self.assertEqual(self.labels('uwa'), ['Ada Uwase'])
+        sources.assert_not_called()
+
+    def test_change_from_elsewhere_is_picked_up(self):
+        typeahead.bump_shared_version()
+        self.assertNotEqual(typeahead._index.version, typeahead.shared_version())
+        typeahead._index.checked_at = 0
+        with mock.patch.object(typeahead, 'rebuild_in_background') as rebuild:
+            self.assertEqual(self.labels('mugisha'), ['Ada Mugisha1'])
+        rebuild.assert_called_once_with()
+
+
+class PatientSearchTests(TestCase):
+    """Doctors find the patients they treat, not ones who only shared a device."""
+
+    def setUp(self):
+        self.doctor = make_doctor(1)
+        self.treated = make_patient(1)
+        self.treated.doctors.add(self.doctor)
+        self.shared = make_patient(2)
+        device = WearableDevice.objects.create(
+            patient=self.shared, device_id='watch-1', device_type='Smartwatch', model='W1',
+            reading_type='heart_rate', unit='bpm',
+        )
+        device.authorized_doctors.add(self.doctor)
+
+    def test_name_and_national_id_scoped_to_treated_patients(self):
+        self.assertEqual(search_patients('patient', self.doctor), [(self.treated.pk, 10)])
+        self.assertEqual(search_patients('1199', self.doctor), [(self.treated.pk, 50)])
+        self.assertEqual(len(search_patients('patient')), 2)
+
+    def test_later_terms_must_all_match(self):
+        self.assertEqual(search_patients('pat no1', self.doctor), [(self.treated.pk, 15)])
+        self.assertEqual(search_patients('pat no2', self.doctor), [])
+
+
+class DeviceReadingTests(TestCase):
+    """A value written on the device row is stored like any ingested reading."""
+
+    def setUp(self):
+        self.patient = make_patient(1)
+        self.client.force_login(self.patient.user)
+
+    def test_device_create_and_update_go_through_ingest(self):
+        response = self.client.post('/api/wearables/', {
+            'patient': self.patient.pk, 'device_id': 'watch-1', 'device_type': 'Smartwatch', 'model': 'W1',
+            'reading_type': 'heart_rate', 'value_of_reading': '72.00', 'unit': 'bpm',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(LatestReading.objects.get().value, 72)
+        device_url = f"/api/wearables/{response.json()['id']}/"
+        self.client.patch(device_url, {'value_of_reading': '80.00'}, content_type='application/json')
+        self.assertEqual(LatestReading.objects.get().value, 80)
+        self.client.patch(device_url, {'model': 'W2'}, content_type='application/json')
+        self.assertEqual(WearableReading.objects.count(), 2)
+
+
+class ConcurrentIngestTests(TransactionTestCase):
+    """Overlapping uploads for one device racing each other store every sample exactly once."""
+
+    def setUp(self):
+        # Threads on SQLite's shared-cache memory database fail on table locks instead of waiting
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("needs a file-backed test database (DATABASES['default']['TEST']['NAME'])")
+
+    def test_overlapping_batches(self):
+        patient = make_patient(1)
+        device = WearableDevice.objects.create(
+            patient=patient, device_id='watch-1', device_type='Smartwatch', model='W1',
+            reading_type='heart_rate', unit='bpm',
+        )
+        start = datetime(2024, 3, 1, 8, tzinfo=dt_timezone.utc)
+        errors = []
+
+        def upload(offset):
+            try:
+                wearables.ingest_readings(device, [
+                    {'reading_type': 'heart_rate', 'value': 70, 'timestamp': start + timedelta(minutes=offset + i)}
+                    for i in range(50)
+                ])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=upload, args=(offset,)) for offset in (0, 25, 0, 25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wearables.recent_reading_keys.clear()
+        self.assertEqual(errors, [])
+        self.assertEqual(WearableReading.objects.count(), 75)
+        self.assertEqual(LatestReading.objects.get().timestamp, start + timedelta(minutes=74))
+
+
+class ReadingsTestCase(TestCase):
+    """A patient with one heart-rate device, logged in."""
+
+    start = datetime(2024, 3, 1, 8, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.patient = make_patient(1)
+        self.device = WearableDevice.objects.create(
+            patient=self.patient, device_id='watch-1', device_type='Smartwatch', model='W1',
+            reading_type='heart_rate', unit='bpm',
+        )
+        self.client.force_login(self.patient.user)
+        self.addCleanup(wearables.recent_reading_keys.clear)
+        self.addCleanup(cache.clear)
+
+    def add_reading(self, minutes, reading_type='heart_rate', **fields):
+        return WearableReading.objects.create(
+            device=self.device, patient=self.patient, reading_type=reading_type, value=60 + minutes,
+            timestamp=self.start + timedelta(minutes=minutes), **fields,
+        )
+
+
+class IdempotencyKeyTests(ReadingsTestCase):
+    """The first request with a key is applied once; retries replay it or wait for it."""
+
+    def post(self, key, minutes=(0, 1)):
+        return self.client.post(
+            f'/api/wearables/{self.device.pk}/readings/bulk/',
+            {'readings': [
+                {'reading_type': 'heart_rate', 'value': 70, 'timestamp': (self.start + timedelta(minutes=m)).isoformat()}
+                for m in minutes
+            ]},
+            content_type='application/json', headers={'Idempotency-Key': key},
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.post('k1')
+        self.assertEqual(first.status_code, 201)
+        retry = self.post('k1', minutes=(0, 1, 2))
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(WearableReading.objects.count(), 2)
+
+    def test_claimed_key_is_a_conflict(self):
+        cache.add(wearables.idempotency_cache_key(self.device, 'k2'), wearables.IDEMPOTENCY_IN_PROGRESS)
+        self.assertEqual(self.post('k2').status_code, 409)
+        self.assertFalse(WearableReading.objects.exists())
+
+
+class KeysetPaginationTests(ReadingsTestCase):
+    """Pages follow (timestamp, id) without gaps or repeats, ties included."""
+
+    def setUp(self):
+        super().setUp()
+        # Pairs of readings share a timestamp, so pages must split ties on id
+        for minutes in range(4):
+            self.add_reading(minutes)
+            self.add_reading(minutes, reading_type='spo2')
+        self.readings = WearableReading.objects.order_by('timestamp', 'pk')
+
+    def test_forward_and_back(self):
+        pages, cursor = [], None
+        while True:
+            page = keyset_page(self.readings, 'timestamp', 3, cursor)
+            pages.append([reading.pk for reading in page])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sum(pages, []), [reading.pk for reading in self.readings])
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 2])
+        previous = keyset_page(self.readings, 'timestamp', 3, page.previous_cursor)
+        self.assertEqual([reading.pk for reading in previous], pages[1])
+
+    def test_api_links_next_page(self):
+        url = f'/api/wearables/readings/?patient={self.patient.pk}&limit=5'
+        first = self.client.get(url)
+        next_url = first['Link'].split(';')[0].strip('<>')
+        second = self.client.get(next_url)
+        self.assertNotIn('Link', second)
+        ids = [row['id'] for row in first.json() + second.json()]
+        self.assertEqual(ids, [reading.pk for reading in self.readings])
+
+
+class RollupWatermarkTests(ReadingsTestCase):
+    """Rollups only fold ids seen a safety lag ago, so a late commit below them is not skipped."""
+
+    def age_watermark(self):
+        RollupWatermark.objects.filter(resolution='hour').update(
+            observed_at=timezone.now() - rollups.ROLLUP_SAFETY_LAG - timedelta(seconds=1),
+        )
+
+    def test_late_lower_id_is_folded(self):
+        self.add_reading(0, id=10)
+        self.assertEqual(rollups.update_rollups('hour'), 0)
+        # Drew a lower id but committed after id 10 had been observed
+        self.add_reading(1, id=5)
+        self.age_watermark()
+        self.assertEqual(rollups.update_rollups('hour'), 2)
+        self.assertEqual(ReadingRollup.objects.get(resolution='hour').count, 2)
+        self.age_watermark()
+        self.assertEqual(rollups.update_rollups('hour'), 0)
+
+
+class SeriesPackingTests(TestCase):
+    """The AHV2 layout decodes back to the series with plain struct and NumPy reads."""
+
+    start = datetime(2024, 3, 1, 8, tzinfo=dt_timezone.utc)
+
+    def unpack(self, payload):
+        magic, flags, count = wearables.SERIES_HEADER.unpack_from(payload)
+        offset = wearables.SERIES_HEADER.size
+        if flags & wearables.SERIES_DELTA:
+            first = np.frombuffer(payload, '<i8', 1, offset)
+            gaps = np.frombuffer(payload, '<i4', count - 1, offset + 8)
+            millis = np.concatenate([first, first[0] + np.cumsum(gaps, dtype='<i8')])
+            time_bytes = 8 + 4 * (count - 1)
+        else:
+            millis = np.frombuffer(payload, '<i8', count, offset)
+            time_bytes = 8 * count
+        offset += time_bytes + (-time_bytes % wearables.SERIES_ALIGNMENT)
+        self.assertEqual(offset % wearables.SERIES_ALIGNMENT, 0)
+        values = np.frombuffer(payload, '<f4', count, offset)
+        return magic, flags, millis.tolist(), values.tolist()
+
+    def test_round_trip(self):
+        timestamps = [self.start + timedelta(seconds=seconds) for seconds in (0, 1, 3, 7, 15)]
+        values = [70.5, 71.0, 72.25, 69.75, 80.0]
+        millis = [round(t.timestamp() * 1000) for t in timestamps]
+        for delta in (True, False):
+            payload = wearables.pack_series(timestamps, values, delta=delta)
+            self.assertEqual(len(payload) % wearables.SERIES_ALIGNMENT, 0)
+            self.assertEqual(self.unpack(payload), (b'AHV2', int(delta), millis, values))
+
+    def test_wide_gaps_fall_back_to_absolute_timestamps(self):
+        timestamps = [self.start, self.start + timedelta(days=60)]
+        payload = wearables.pack_series(timestamps, [1.0, 2.0])
+        self.assertEqual(self.unpack(payload)[1:], (0, [round(t.timestamp() * 1000) for t in timestamps], [1.0, 2.0]))
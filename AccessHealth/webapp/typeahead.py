@@ -0,0 +1,264 @@
+"""
+In-process typeahead over the doctor directory.
+
+Doctor names, specializations, hospital names and districts are held in
+memory as a sorted list of ``(key, suggestion)`` pairs, with one key per
+word-suffix of the label ("jean claude niyonzima", "claude niyonzima",
+"niyonzima"). A prefix of any word is then a bisect plus a short forward
+scan, with no database query, so the endpoint can fire on every keystroke.
+
+The index is built on first use and kept current incrementally by the
+Doctor and Hospital receivers in ``signals.py``. Every change also
+increments a version in the cache (shared between workers, see CACHES in
+settings). The writer applies its change in place and stays current when
+the increment shows nobody else changed anything in between; any process
+that finds itself behind, checked every ``VERSION_CHECK_INTERVAL``
+seconds, rebuilds its copy on a background thread and keeps answering
+from the old one until the new one is ready.
+"""
+import bisect
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .models import Doctor, Hospital
+from .patient_search import normalise
+
+VERSION_KEY = 'typeahead:version'
+# Seconds between checks of the shared version; bounds staleness across processes
+VERSION_CHECK_INTERVAL = 5
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+KINDS = ('doctor', 'specialization', 'hospital', 'district')
+DOCTOR_FIELDS = ('id', 'first_name', 'last_name', 'specialization', 'primary_practice_district', 'district')
+
+
+def doctor_suggestions(doctor):
+    """The ``(kind, value, label)`` suggestions one doctor contributes."""
+    suggestions = {
+        ('doctor', doctor.pk, f"{doctor.first_name} {doctor.last_name}"),
+        ('specialization', doctor.specialization, doctor.get_specialization_display()),
+    }
+    for district in (doctor.primary_practice_district, doctor.district):
+        if district:
+            suggestions.add(('district', district, district))
+    return suggestions
+
+
+def hospital_suggestions(hospital):
+    suggestions = {('hospital', hospital.pk, hospital.name)}
+    if hospital.district:
+        suggestions.add(('district', hospital.district, hospital.district))
+    return suggestions
+
+
+def suggestion_keys(suggestion):
+    words = normalise(suggestion[2])
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class TypeaheadIndex:
+    """
+    Sorted ``(key, suggestion)`` pairs with per-source bookkeeping.
+
+    Several sources can contribute the same suggestion (a district shared by
+    doctors and hospitals); it stays listed until the last one drops it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+        self.refcounts = {}
+        self.sources = {}
+        self.built = False
+        self.version = None
+        self.checked_at = 0.0
+        self.rebuilding = False
+
+    def load(self, sources):
+        """Replace the whole index with ``{source: suggestions}``."""
+        refcounts = {}
+        for suggestions in sources.values():
+            for suggestion in suggestions:
+                refcounts[suggestion] = refcounts.get(suggestion, 0) + 1
+        entries = sorted((key, suggestion) for suggestion in refcounts for key in suggestion_keys(suggestion))
+        with self.lock:
+            self.entries, self.refcounts, self.sources = entries, refcounts, dict(sources)
+            self.built = True
+
+    def add(self, suggestion):
+        count = self.refcounts.get(suggestion, 0)
+        self.refcounts[suggestion] = count + 1
+        if not count:
+            for key in suggestion_keys(suggestion):
+                bisect.insort(self.entries, (key, suggestion))
+
+    def discard(self, suggestion):
+        count = self.refcounts.pop(suggestion, 0)
+        if count > 1:
+            self.refcounts[suggestion] = count - 1
+            return
+        for key in suggestion_keys(suggestion):
+            position = bisect.bisect_left(self.entries, (key, suggestion))
+            if position < len(self.entries) and self.entries[position] == (key, suggestion):
+                del self.entries[position]
+
+    def set_source(self, source, suggestions):
+        """Make ``source`` contribute exactly ``suggestions`` (empty to remove it)."""
+        with self.lock:
+            previous = self.sources.pop(source, set())
+            if suggestions:
+                self.sources[source] = suggestions
+            for suggestion in previous - suggestions:
+                self.discard(suggestion)
+            for suggestion in suggestions - previous:
+                self.add(suggestion)
+
+    def lookup(self, text, kinds=None, limit=DEFAULT_SUGGESTIONS):
+        """Up to ``limit`` suggestions with a word starting with ``text``, in key order."""
+        prefix = ' '.join(normalise(text))
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self.lock:
+            position = bisect.bisect_left(self.entries, (prefix,))
+            while position < len(self.entries) and len(results) < limit:
+                key, suggestion = self.entries[position]
+                if not key.startswith(prefix):
+                    break
+                if suggestion not in seen and (kinds is None or suggestion[0] in kinds):
+                    seen.add(suggestion)
+                    results.append(suggestion)
+                position += 1
+        return results
+
+
+_index = TypeaheadIndex()
+
+
+def directory_sources():
+    sources = {
+        ('doctor', doctor.pk): doctor_suggestions(doctor)
+        for doctor in Doctor.objects.only(*DOCTOR_FIELDS).iterator()
+    }
+    sources.update(
+        (('hospital', hospital.pk), hospital_suggestions(hospital))
+        for hospital in Hospital.objects.only('id', 'name', 'district').iterator()
+    )
+    return sources
+
+
+def shared_version():
+    # Seeded from the clock so an evicted counter never reuses an old version
+    cache.add(VERSION_KEY, time.time_ns(), None)
+    return cache.get(VERSION_KEY)
+
+
+def bump_shared_version():
+    """The incremented shared version, or None if it had been evicted and was reseeded."""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+        return None
+
+
+_build_lock = threading.Lock()
+
+
+def rebuild_index():
+    """Reload this process's index from the database at the current shared version."""
+    try:
+        # Read before the rows, so a change committed meanwhile leaves the index behind, not ahead
+        version = shared_version()
+        _index.load(directory_sources())
+        _index.version = version
+    finally:
+        _index.rebuilding = False
+
+
+def rebuild_in_background():
+    with _build_lock:
+        if _index.rebuilding:
+            return
+        _index.rebuilding = True
+
+    def run():
+        try:
+            rebuild_index()
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, name='typeahead-rebuild', daemon=True).start()
+
+
+def get_index():
+    """
+    This process's index.
+
+    The first call builds it; after that, falling behind the shared version
+    starts a background rebuild and the current copy keeps serving lookups.
+    """
+    if not _index.built:
+        with _build_lock:
+            if not _index.built:
+                _index.rebuilding = True
+                rebuild_index()
+        _index.checked_at = time.monotonic()
+        return _index
+    now = time.monotonic()
+    if now - _index.checked_at > VERSION_CHECK_INTERVAL:
+        _index.checked_at = now
+        if shared_version() != _index.version:
+            rebuild_in_background()
+    return _index
+
+
+def update_source(source, suggestions):
+    """Apply one source's change here at once and flag it to the other processes."""
+    version = bump_shared_version()
+    if _index.built:
+        _index.set_source(source, suggestions)
+        # incr is atomic on the LocMem and Redis backends, so landing exactly one
+        # above our version means no other writer came in between
+        if version is not None and _index.version is not None and version == _index.version + 1:
+            _index.version = version
+
+
+def index_doctor(doctor):
+    update_source(('doctor', doctor.pk), doctor_suggestions(doctor))
+
+
+def unindex_doctor(doctor_id):
+    update_source(('doctor', doctor_id), set())
+
+
+def index_hospital(hospital):
+    update_source(('hospital', hospital.pk), hospital_suggestions(hospital))
+
+
+def unindex_hospital(hospital_id):
+    update_source(('hospital', hospital_id), set())
+
+
+@require_GET
+def autocomplete_view(request):
+    """
+    Suggestions for ``q`` as ``{"results": [{"kind", "value", "label"}, ...]}``.
+
+    ``kind`` (repeatable) narrows to doctor, specialization, hospital or
+    district; ``limit`` caps the list (at most 20).
+    """
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_SUGGESTIONS)), MAX_SUGGESTIONS)
+    except ValueError:
+        return JsonResponse({'detail': 'limit must be an integer.'}, status=400)
+    kinds = set(request.GET.getlist('kind')) & set(KINDS) or None
+    suggestions = get_index().lookup(request.GET.get('q', ''), kinds, limit)
+    return JsonResponse({
+        'results': [{'kind': kind, 'value': value, 'label': label} for kind, value, label in suggestions],
+    })
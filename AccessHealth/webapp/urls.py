@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, views_stream
 urlpatterns = [
     path('doctor/signup/', views.doctor_signup_view, name='doctor_signup'),
     path('patient/signup/', views.patient_signup_view, name='patient_signup'),
@@ -18,7 +18,9 @@ urlpatterns = [
     path('consultations/<int:pk>/delete/', views.consultation_delete, name='consultation-delete'),
     path('doctor/settings/', views.doctor_settings, name='doctor-settings'),
     path('logout/', views.logout_view, name='logout'),
+    path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark-all-notifications-read'),
     path('patient/dashboard/', views.patient_dashboard, name='patient_dashboard'),
+    path('vitals/stream/', views_stream.vitals_stream, name='vitals_stream'),
     path('patient/book-appointment/', views.book_appointment, name='book_appointment'),
     path('cancel-appointment/<int:appointment_id>/', views.cancel_appointment, name='cancel_appointment'),
     path("patient/find-doctors/", views.find_doctors_view, name="find_doctors"),
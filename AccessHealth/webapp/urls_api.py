@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views_api
+from . import views_api, ingest_gateway, typeahead
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
@@ -19,5 +19,7 @@ router.register(r'notifications', views_api.NotificationViewSet)
 router.register(r'patient-preferences', views_api.PatientNotificationPreferenceViewSet)
 
 urlpatterns = [
+    path('ingest/<str:device_id>/', ingest_gateway.ingest_view, name='wearable-ingest'),
+    path('autocomplete/', typeahead.autocomplete_view, name='autocomplete'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -5,11 +5,25 @@ from django.contrib.auth.models import User
 from .forms import *
 from django.contrib.auth.decorators import login_required
 from django.views import View
+from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.db.models import Q, Count, Avg, Subquery, OuterRef
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.db.models import Q, F, Count, Avg, Max, Subquery, OuterRef, Value, DecimalField
+from django.db.models.functions import Coalesce
 from django.contrib.auth.mixins import LoginRequiredMixin
 from datetime import timedelta
+from decimal import Decimal
 from .models import *
+from .clinical_search import search_clinical_notes
+from .facets import doctor_facets, fee_band_q, fee_subquery
+from .fragments import FRAGMENT_TTL, panel_versions
+from .keyset import approximate_count, keyset_page
+from .metrics import get_doctor_metrics
+from .middleware import doctor_or_404, patient_or_404, remember_profile
+from .notifications import mark_all_read, recipient_of
+from .patient_search import matching_patients
+from .search import filter_doctors, relevance_order
 from django.core.paginator import Paginator
 from django.http import HttpResponse
 from django.contrib.auth.forms import PasswordChangeForm
@@ -62,6 +76,7 @@ def patient_login_view(request):
                 # 3. CRITICAL FIX: Check for 'patient_profile' instead of 'patient'
                 if hasattr(user, 'patient_profile'):
                     login(request, user)
+                    remember_profile(request, user.patient_profile)
                     messages.success(request, "Login successful.")
                     return redirect('patient_dashboard')
                 else:
@@ -88,6 +103,7 @@ def doctor_login_view(request):
                 # 2. CRITICAL CHECK: Is this user actually a Doctor?
                 if hasattr(user, 'doctor_profile'):
                     login(request, user)
+                    remember_profile(request, user.doctor_profile)
                     
                     # Use the doctor's name if available, otherwise fallback
                     doctor_name = user.last_name if user.last_name else user.username
@@ -122,9 +138,8 @@ class DoctorDashboardView(LoginRequiredMixin, View):
     redirect_field_name = 'next'
     
     def get(self, request, *args, **kwargs):
-        try:
-            doctor = Doctor.objects.get(user=request.user)
-        except Doctor.DoesNotExist:
+        doctor = request.profile.doctor
+        if doctor is None:
             return render(request, 'error.html', {
                 'error': 'Doctor profile not found',
                 'message': 'Please contact administrator'
@@ -132,46 +147,22 @@ class DoctorDashboardView(LoginRequiredMixin, View):
         
         today = timezone.now().date()
         
-        # ✅ GET NOTIFICATIONS FIRST (before slicing)
-        all_notifications = Notification.objects.filter(doctor=doctor).order_by('-created_at')
-        unread_count = all_notifications.filter(is_read=False).count()
-        notifications = all_notifications[:5]
+        # Latest notifications; the unread badge comes from the notifications context processor
+        notifications = Notification.objects.filter(doctor=doctor).order_by('-created_at')[:5]
         form = AppointmentForm()
-        # Today's appointments
-        today_appointments = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=today
-        ).order_by('appointment_time').select_related('patient')
-        
-        # Upcoming appointments
-        upcoming_appointments = Appointment.objects.filter(
+
+        # Today's and the coming week's appointments in one query, split in Python.
+        # Lazy, so nothing is fetched when the panels using them come from the fragment cache.
+        week = SimpleLazyObject(lambda: list(Appointment.objects.filter(
             doctor=doctor,
             appointment_date__gte=today,
             appointment_date__lte=today + timedelta(days=7)
-        ).exclude(
-            appointment_date=today
-        ).select_related('patient').order_by('appointment_date', 'appointment_time')[:5]
-        
-        # Recent patients (NO slice until the end)
-        recent_patients = Patient.objects.filter(
-            appointments__doctor=doctor
-        ).order_by('-appointments__appointment_date').distinct()[:4]
-        
-        # Key metrics
-        total_patients = Patient.objects.filter(
-            appointments__doctor=doctor
-        ).distinct().count()
-        
-        pending_appointments = Appointment.objects.filter(
-            doctor=doctor,
-            status='pending'
-        ).count()
-        
-        this_month_appointments = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date__year=today.year,
-            appointment_date__month=today.month
-        ).count()
+        ).select_related('patient').order_by('appointment_date', 'appointment_time')))
+        today_appointments = SimpleLazyObject(lambda: [a for a in week if a.appointment_date == today])
+        upcoming_appointments = SimpleLazyObject(lambda: [a for a in week if a.appointment_date != today][:5])
+
+        # Key metrics (cached; invalidated on appointment/review writes)
+        metrics = get_doctor_metrics(doctor, today)
         
         # Context with ALL data
         context = {
@@ -180,39 +171,40 @@ class DoctorDashboardView(LoginRequiredMixin, View):
             'today_appointments': today_appointments,
             'recent_appointments': today_appointments,
             'upcoming_appointments': upcoming_appointments,
-            'recent_patients': recent_patients,
-            'total_patients': total_patients,
-            'pending_count': pending_appointments,
-            'month_appointments': this_month_appointments,
-            'avg_rating': 4.5,  # Or calculate from Review model
+            'recent_patients': metrics['recent_patients'],
+            'total_patients': metrics['total_patients'],
+            'pending_count': metrics['pending_count'],
+            'month_appointments': metrics['month_appointments'],
+            'avg_rating': metrics['avg_rating'],
             'notifications': notifications,  # ✅ Already sliced
-            'unread_notifications_count': unread_count,  # ✅ Counted BEFORE slice
             'form':form,
+            'versions': panel_versions('doctor', doctor.pk),
+            'fragment_ttl': FRAGMENT_TTL,
         }
         
         return render(request, 'doctor_dashboard.html', context)
 
 @login_required
 def patients_list(request):
-    try:
-        # Get the Doctor profile for the logged-in user
-        doctor = Doctor.objects.get(user=request.user)
-    except Doctor.DoesNotExist:
-        doctor = None
+    # Doctor profile of the logged-in user, resolved once per request by ProfileMiddleware
+    doctor = request.profile.doctor
+    if doctor is None:
         # Handle case where doctor profile doesn't exist (return empty list)
         return render(request, 'patients_list.html', {'page_obj': None})
 
     # Use 'doctors' (plural) to match your model field name
-    all_patients = Patient.objects.filter(doctors=doctor).order_by('-created_at')
+    # Last visit and visit count are annotated so rows don't query appointments one by one
+    completed = Q(appointments__status='completed')
+    all_patients = Patient.objects.filter(doctors=doctor).annotate(
+        last_visit_date=Max('appointments__appointment_date', filter=completed),
+        visit_count=Count('appointments', filter=completed),
+    ).order_by('-created_at')
 
     # Search Logic
     query = request.GET.get('q')
     if query:
-        all_patients = all_patients.filter(
-            first_name__icontains=query
-        ) | all_patients.filter(
-            last_name__icontains=query
-        )
+        # Index-backed lookup by national ID prefix or name prefixes, within this doctor's patients
+        all_patients = matching_patients(query, all_patients)
 
     # Pagination
     paginator = Paginator(all_patients, 10) 
@@ -230,9 +222,8 @@ def patients_list(request):
 def add_medical_record(request, pk):
     patient = get_object_or_404(Patient, pk=pk)
     
-    try:
-        doctor = request.user.doctor_profile # Or Doctor.objects.get(user=request.user)
-    except:
+    doctor = request.profile.doctor
+    if doctor is None:
         messages.error(request, "You must be a doctor to add records.")
         return redirect('webapp:patients_list')
 
@@ -268,7 +259,7 @@ def add_medical_record(request, pk):
 
 @login_required
 def appointments_list(request):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
     
     q = request.GET.get('q', '').strip()
     qs = Appointment.objects.filter(doctor=doctor).select_related('patient')
@@ -293,7 +284,7 @@ def appointments_list(request):
     return render(request, 'doctor_appointments.html', context)
 @login_required
 def appointment_create(request):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
 
     if request.method == 'POST':
         # Pass the doctor to the form for validation
@@ -327,7 +318,7 @@ def appointment_create(request):
 # --- 2. EDIT APPOINTMENT (Action Only) ---
 @login_required
 def appointment_edit(request, pk):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
     appointment = get_object_or_404(Appointment, pk=pk, doctor=doctor)
 
     if request.method == 'POST':
@@ -347,7 +338,7 @@ def appointment_edit(request, pk):
 # --- 3. DELETE APPOINTMENT (Action Only) ---
 @login_required
 def appointment_delete(request, pk):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
     appointment = get_object_or_404(Appointment, pk=pk, doctor=doctor)
 
     if request.method == 'POST':
@@ -360,7 +351,7 @@ def appointment_delete(request, pk):
 
 @login_required
 def consultations_list(request):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
 
     q = request.GET.get('q', '').strip()
     status = request.GET.get('status', '').strip()
@@ -368,11 +359,18 @@ def consultations_list(request):
     qs = Consultation.objects.filter(doctor=doctor).select_related('patient')
     consultation_form = ConsultationForm()
 
+    snippets = {}
     if q:
+        hits = search_clinical_notes(doctor, q, source='consultation')
+        if hits is None:
+            notes_match = Q(diagnosis__icontains=q)
+        else:
+            snippets = {hit['source_id']: hit['snippet'] for hit in hits}
+            notes_match = Q(pk__in=list(snippets))
         qs = qs.filter(
             Q(patient__first_name__icontains=q) |
             Q(patient__last_name__icontains=q) |
-            Q(diagnosis__icontains=q) |
+            notes_match |
             Q(consultation_type__icontains=q)
         )
 
@@ -384,6 +382,8 @@ def consultations_list(request):
     paginator = Paginator(qs, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    for consultation in page_obj:
+        consultation.search_snippet = snippets.get(consultation.pk)
 
     context = {
         'doctor': doctor,
@@ -394,7 +394,7 @@ def consultations_list(request):
 
 @login_required
 def consultation_create(request):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
 
     if request.method == 'POST':
         form = ConsultationForm(request.POST)
@@ -413,7 +413,7 @@ def consultation_create(request):
 @login_required
 def consultation_edit(request, pk):
     # Security: Ensure the doctor exists and owns this consultation
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
     consultation = get_object_or_404(Consultation, pk=pk, doctor=doctor)
 
     if request.method == 'POST':
@@ -434,7 +434,7 @@ def consultation_edit(request, pk):
 @login_required
 def consultation_delete(request, pk):
     # Security: Ensure ownership
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = doctor_or_404(request)
     consultation = get_object_or_404(Consultation, pk=pk, doctor=doctor)
 
     if request.method == 'POST':
@@ -445,7 +445,7 @@ def consultation_delete(request, pk):
 
 @login_required
 def doctor_settings(request):
-    doctor = get_object_or_404(Doctor, user=request.user)
+    doctor = get_object_or_404(Doctor.objects.select_related('stats'), user=request.user)
     
     # Initialize forms with current data
     profile_form = DoctorProfileForm(instance=doctor)
@@ -496,38 +496,48 @@ def logout_view(request):
     return redirect('landing')
 
 
+@login_required
+@require_POST
+def mark_all_notifications_read(request):
+    recipient = recipient_of(request.profile)
+    if recipient and 'doctor' in recipient:
+        mark_all_read(recipient['doctor'])
+    target = request.POST.get('next') or request.META.get('HTTP_REFERER')
+    if not url_has_allowed_host_and_scheme(target, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        target = 'landing'
+    return redirect(target)
+
+
 @login_required
 def patient_dashboard(request):
-    patient = get_object_or_404(Patient, user=request.user)
-
-    # Latest readings per type for this patient
-    latest_heart = (WearableDevice.objects
-                    .filter(patient=patient, reading_type='heart_rate')
-                    .order_by('-time')
-                    .first())
-    latest_bp = (WearableDevice.objects
-                 .filter(patient=patient, reading_type='blood_pressure')
-                 .order_by('-time')
-                 .first())
-    latest_temp = (WearableDevice.objects
-                   .filter(patient=patient, reading_type='temperature')
-                   .order_by('-time')
-                   .first())
-    latest_spo2 = WearableDevice.objects.filter(
-    patient=patient, reading_type='oxygen_saturation').order_by('-time').first()
+    patient = patient_or_404(request)
+
+    # Latest readings per type for this patient (one lookup in the maintained store)
+    latest = {r.reading_type: r for r in LatestReading.objects.filter(patient=patient)}
+    latest_heart = latest.get('heart_rate')
+    latest_bp = latest.get('blood_pressure')
+    latest_temp = latest.get('temperature')
+    latest_spo2 = latest.get('oxygen_saturation')
     appointment_form = PatientBookAppointmentForm()
 
+    # Panel data below is lazy: panels served from the fragment cache never query it
+
     # Device stats
-    total_devices = WearableDevice.objects.filter(patient=patient).count()
-    active_devices = WearableDevice.objects.filter(patient=patient, is_active=True).count()
+    device_stats = SimpleLazyObject(lambda: WearableDevice.objects.filter(patient=patient).aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+    ))
+    total_devices = SimpleLazyObject(lambda: device_stats['total'])
+    active_devices = SimpleLazyObject(lambda: device_stats['active'])
 
     # Next upcoming appointment
     today = timezone.localdate()
     now_time = timezone.localtime().time()
-    next_appointment = (Appointment.objects
+    next_appointment = SimpleLazyObject(lambda: Appointment.objects
                         .filter(patient=patient,
                                 appointment_date__gte=today,
                                 status__in=['pending', 'confirmed'])
+                        .select_related('doctor__user')
                         .order_by('appointment_date', 'appointment_time')
                         .first())
     notifications = (
@@ -536,12 +546,11 @@ def patient_dashboard(request):
     .select_related('doctor')
     .order_by('-created_at')[:5]   
 )
-    unread_count = Notification.objects.filter(patient=patient, is_read=False).count()
     devices = WearableDevice.objects.filter(patient=patient).order_by('-time')
-    appt_qs = Appointment.objects.filter(patient=patient)
+    appt_qs = Appointment.objects.filter(patient=patient).select_related('doctor__user')
     paginator = Paginator(appt_qs, 4)  # 4 cards per page
     page_number = request.GET.get("page")
-    appt_page = paginator.get_page(page_number)
+    appt_page = SimpleLazyObject(lambda: paginator.get_page(page_number))
 
     context = {
         "patient": patient,
@@ -552,11 +561,14 @@ def patient_dashboard(request):
         "active_devices": active_devices,
         "next_appointment": next_appointment,
         "notifications": notifications,
-        "unread_count": unread_count,
         "latest_spo2": latest_spo2,
         "devices": devices,
         "appt_page": appt_page,
         'appointment_form': appointment_form,
+        'today': today,
+        'page_number': page_number,
+        'versions': panel_versions('patient', patient.pk),
+        'fragment_ttl': FRAGMENT_TTL,
     }
     return render(request, "patientdashboard.html", context)
 
@@ -566,18 +578,21 @@ def find_doctors_view(request):
     q = request.GET.get("q", "").strip()
     specialty = request.GET.get("specialty", "")
     location = request.GET.get("location", "")
-    sort = request.GET.get("sort", "price_asc")
+    gender = request.GET.get("gender", "")
+    fee_band = request.GET.get("fee", "")
+    sort = request.GET.get("sort") or ("relevance" if q else "price_asc")
 
     # 2. Start with all doctors
     doctors_qs = Doctor.objects.all()
 
-    # 3. Apply Search (Name or Specialty)
-    if q:
-        doctors_qs = doctors_qs.filter(
-            Q(first_name__icontains=q) |
-            Q(last_name__icontains=q) |
-            Q(specialization__icontains=q)
-        )
+    # 3. Apply Search: ranked full-text match over names, specialty, bio, hospitals and districts
+    doctors_qs, matched_ids = filter_doctors(doctors_qs, q)
+
+    # Facet counts for the dropdowns; without a search term they come from cache
+    facets = doctor_facets(
+        doctors_qs if q else None,
+        {"specialty": specialty, "location": location, "gender": gender, "fee": fee_band},
+    )
 
     # 4. Filter by Specialty
     if specialty and specialty != "all":
@@ -587,56 +602,56 @@ def find_doctors_view(request):
     if location and location != "all":
         doctors_qs = doctors_qs.filter(primary_practice_district__iexact=location)
 
-    # 6. Annotate Data (Fees, Ratings)
-    # Subquery: get the consultation fee from the primary hospital relationship
-    fee_subquery = DoctorHospital.objects.filter(
-            doctor=OuterRef("pk")
-            # We removed the filter!
-        ).values('hospital__consultation_fee')[:1]
+    if gender and gender != "all":
+        doctors_qs = doctors_qs.filter(gender=gender)
 
+    # 6. Annotate Data (Fees, Ratings)
+    # Ratings come from the maintained DoctorStats row instead of aggregating reviews
     doctors_qs = doctors_qs.annotate(
-        avg_rating=Avg("reviews__rating"),
-        review_count=Count("reviews"),
-        consultation_fee=Subquery(fee_subquery)
+        avg_rating=F("stats__avg_rating"),
+        review_count=F("stats__review_count"),
+        consultation_fee=fee_subquery()
     )
 
-    # 7. Apply Sorting
-    if sort == "price_desc":
-        # Sort by fee high-to-low. Use 0 as fallback if fee is None
-        doctors_qs = doctors_qs.order_by("-consultation_fee")
-    elif sort == "price_asc":
-        doctors_qs = doctors_qs.order_by("consultation_fee")
+    fee_filter = fee_band_q(fee_band) if fee_band and fee_band != "all" else None
+    if fee_filter is not None:
+        doctors_qs = doctors_qs.filter(fee_filter)
+
+    # 7. Apply Sorting: a non-null sort key (missing fees and ratings sort as -1) that pages can seek on
+    if sort in ("price_asc", "price_desc"):
+        doctors_qs = doctors_qs.annotate(sort_key=Coalesce(
+            "consultation_fee", Value(Decimal(-1)), output_field=DecimalField(max_digits=10, decimal_places=2)
+        ))
+        descending = sort == "price_desc"
+    elif sort == "relevance" and matched_ids:
+        doctors_qs = doctors_qs.annotate(sort_key=relevance_order(matched_ids))
+        descending = False
     else:
         # Default: Sort by rating high-to-low
-        doctors_qs = doctors_qs.order_by("-avg_rating")
+        doctors_qs = doctors_qs.annotate(sort_key=Coalesce("avg_rating", Value(-1.0)))
+        descending = True
 
-    # 8. Pagination (6 doctors per page)
-    paginator = Paginator(doctors_qs, 6)
-    page_number = request.GET.get("page")
-    doctors_page = paginator.get_page(page_number)
+    # 8. Keyset pagination (6 doctors per page): seeks past the previous page instead of OFFSET + COUNT(*)
+    doctors_page = keyset_page(doctors_qs, "sort_key", 6, request.GET.get("cursor"), descending=descending)
+    total_doctors, total_is_exact = approximate_count(doctors_qs)
 
-    # 9. Get unique values for dropdowns (Ordered alphabetically)
-    unique_locations = Doctor.objects.values_list(
-        "primary_practice_district", flat=True
-    ).distinct().order_by("primary_practice_district")
-    
-    unique_specialties = Doctor.objects.values_list(
-        "specialization", flat=True
-    ).distinct().order_by("specialization")
     booking_form = PatientBookAppointmentForm()
 
     context = {
         "doctors_page": doctors_page,
         "booking_form": booking_form,
-        # Pass filter lists to the template
-        "locations": unique_locations,
-        "specialties": unique_specialties,
-        
+        # Filter options with counts for the dropdowns
+        "facets": facets,
+
         # Pass current selections back (to keep dropdowns selected)
         "q": q,
         "selected_specialty": specialty,
         "selected_location": location,
+        "selected_gender": gender,
+        "selected_fee": fee_band,
         "sort": sort,
+        "total_doctors": total_doctors,
+        "total_is_exact": total_is_exact,
     }
 
     return render(request, "find_doctors.html", context)
@@ -648,7 +663,7 @@ def triage_page(request):
 
 @login_required
 def patient_profile_settings(request):
-    patient = get_object_or_404(Patient, user=request.user)
+    patient = patient_or_404(request)
     prefs, _ = PatientNotificationPreference.objects.get_or_create(patient=patient)
 
     # Initialize forms with POST data if available, else standard
@@ -722,9 +737,9 @@ def book_appointment(request):
         if form.is_valid():
             appointment = form.save(commit=False)
             
-            try:
-                # 1. Get the Patient profile
-                patient_profile = Patient.objects.get(user=request.user)
+            # 1. Get the Patient profile
+            patient_profile = request.profile.patient
+            if patient_profile is not None:
                 appointment.patient = patient_profile
                 appointment.status = 'pending'
                 
@@ -737,8 +752,7 @@ def book_appointment(request):
 
                 messages.success(request, "Appointment booked and Doctor added to your list!")
                 return redirect('patient_dashboard')
-
-            except Patient.DoesNotExist:
+            else:
                 messages.error(request, "Error: Patient profile not found.")
                 return redirect('patient_dashboard')
                 
@@ -1,17 +1,59 @@
-from rest_framework import viewsets, permissions, filters
+from datetime import timedelta
+
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags, quote_etag
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import (
     Hospital, DoctorHospital, Patient, Doctor, Review, 
     WearableDevice, PatientRecord, Appointment, Notification, 
-    Consultation, PatientNotificationPreference
+    Consultation, PatientNotificationPreference, WearableReading, ReadingRollup
+)
+from .access import authorized_device_ids, user_can_view_patient
+from .archive import read_archived
+from .clinical_search import search_clinical_notes
+from .facets import FACET_FIELDS, doctor_facets
+from .keyset import keyset_page
+from . import notifications
+from .patient_search import search_patients
+from .rollups import RESOLUTIONS
+from .schedule import (
+    APPOINTMENT_FIELDS, CONSULTATION_FIELDS, MAX_CALENDAR_DAYS, calendar_days, calendar_etag
 )
+from .search import filter_doctors
 from .serializers import (
     HospitalSerializer, DoctorHospitalSerializer, PatientSerializer, 
     DoctorSerializer, ReviewSerializer, WearableDeviceSerializer, 
     PatientRecordSerializer, AppointmentSerializer, NotificationSerializer, 
-    ConsultationSerializer, PatientNotificationPreferenceSerializer
+    ConsultationSerializer, PatientNotificationPreferenceSerializer,
+    WearableReadingBulkSerializer, WearableReadingSerializer, ReadingRollupSerializer
 )
+from .wearables import IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_TTL, idempotency_cache_key, ingest_readings, pack_series
+
+READINGS_PAGE_SIZE = 1000
+MAX_READINGS_PAGE_SIZE = 10000
+
+
+def parse_time_range(params):
+    """Read optional ISO-8601 ``start`` / ``end`` query params into datetimes."""
+    bounds = {}
+    for name in ('start', 'end'):
+        raw = params.get(name)
+        if not raw:
+            bounds[name] = None
+            continue
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValidationError({name: 'Expected an ISO-8601 datetime.'})
+        bounds[name] = value
+    return bounds['start'], bounds['end']
 
 # --- Hospital Views ---
 class HospitalViewSet(viewsets.ModelViewSet):
@@ -35,6 +77,40 @@ class PatientViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['first_name', 'last_name', 'patient_national_id']
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked lookup by national ID prefix or partial names (``q``, ``limit`` of 1 to 100).
+
+        Doctors search the patients they treat; staff search everyone. Backed
+        by the token and national ID indexes in ``patient_search``, not LIKE
+        scans.
+        """
+        q = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
+        doctor = request.profile.doctor
+        if doctor is None and not request.user.is_staff:
+            raise PermissionDenied("Only doctors and staff can search patients.")
+        ranked = search_patients(q, doctor=doctor, limit=limit) if q else []
+        patients = Patient.objects.in_bulk([patient_id for patient_id, _ in ranked])
+        return Response({
+            'results': [
+                {
+                    'id': patient_id,
+                    'patient_national_id': patients[patient_id].patient_national_id,
+                    'first_name': patients[patient_id].first_name,
+                    'last_name': patients[patient_id].last_name,
+                    'dob': patients[patient_id].dob,
+                    'score': score,
+                }
+                for patient_id, score in ranked
+                if patient_id in patients
+            ],
+        })
+
 class PatientNotificationPreferenceViewSet(viewsets.ModelViewSet):
     queryset = PatientNotificationPreference.objects.all()
     serializer_class = PatientNotificationPreferenceSerializer
@@ -42,7 +118,7 @@ class PatientNotificationPreferenceViewSet(viewsets.ModelViewSet):
 
 # --- Doctor Views ---
 class DoctorViewSet(viewsets.ModelViewSet):
-    queryset = Doctor.objects.all()
+    queryset = Doctor.objects.select_related('user', 'stats').prefetch_related('hospitals')
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     parser_classes = (MultiPartParser, FormParser)
@@ -50,17 +126,166 @@ class DoctorViewSet(viewsets.ModelViewSet):
     filterset_fields = ['specialization', 'district', 'gender']
     search_fields = ['first_name', 'last_name', 'specialization']
 
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Doctor counts per specialty, location, gender and fee band.
+
+        Takes the find-doctors parameters (``q``, ``specialty``, ``location``,
+        ``gender``, ``fee``); each facet is counted with every other selected
+        filter applied. Without ``q`` the counts come from cache.
+        """
+        params = request.query_params
+        q = params.get('q', '').strip()
+        doctors, _ = filter_doctors(Doctor.objects.all(), q)
+        return Response(doctor_facets(doctors if q else None, {facet: params.get(facet) for facet in FACET_FIELDS}))
+
 # --- Interaction Views ---
 class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+def require_patient_access(request, patient_id):
+    if not user_can_view_patient(request.user, request.profile, patient_id):
+        raise PermissionDenied("You do not have access to this patient's readings.")
+
 class WearableDeviceViewSet(viewsets.ModelViewSet):
     queryset = WearableDevice.objects.all()
     serializer_class = WearableDeviceSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        # Patients see their own devices, doctors the devices in their cached access scope
+        if self.request.user.is_staff:
+            return self.queryset
+        profile = self.request.profile
+        if profile.doctor is not None:
+            return self.queryset.filter(id__in=authorized_device_ids(profile.doctor))
+        return self.queryset.filter(patient=profile.patient)
+
+    @action(detail=False, methods=['get'])
+    def readings(self, request):
+        """
+        Time-series for one patient: ?patient=&reading_type=&start=&end=&resolution=
+
+        ``resolution`` is ``raw`` (default) or one of the rollup windows
+        (minute / hour / day), which reads pre-aggregated buckets instead.
+        Raw requests with ``include_archived=1`` also return readings moved
+        to the archive by archive_readings, on the first page only.
+
+        At most ``limit`` rows (default 1000, at most 10000) are returned,
+        oldest first; when more follow, the ``Link`` header carries the
+        ``rel="next"`` URL, which repeats the query with a ``cursor``.
+        """
+        patient_id = request.query_params.get('patient', '')
+        if not patient_id.isdigit():
+            raise ValidationError({'patient': 'A numeric patient id is required.'})
+        patient_id = int(patient_id)
+        require_patient_access(request, patient_id)
+        resolution = request.query_params.get('resolution', 'raw')
+        if resolution != 'raw' and resolution not in RESOLUTIONS:
+            raise ValidationError({'resolution': f"Expected raw or one of {', '.join(RESOLUTIONS)}."})
+        start, end = parse_time_range(request.query_params)
+        reading_type = request.query_params.get('reading_type')
+        try:
+            limit = min(max(int(request.query_params.get('limit', READINGS_PAGE_SIZE)), 1), MAX_READINGS_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
+        cursor = request.query_params.get('cursor')
+
+        if resolution == 'raw':
+            qs = WearableReading.objects.filter(patient_id=patient_id).order_by('timestamp')
+            time_field, serializer_class = 'timestamp', WearableReadingSerializer
+        else:
+            qs = ReadingRollup.objects.filter(patient_id=patient_id, resolution=resolution)
+            time_field, serializer_class = 'bucket_start', ReadingRollupSerializer
+        if reading_type:
+            qs = qs.filter(reading_type=reading_type)
+        if start:
+            qs = qs.filter(**{f'{time_field}__gte': start})
+        if end:
+            qs = qs.filter(**{f'{time_field}__lt': end})
+        page = keyset_page(qs, time_field, limit, cursor)
+        data = serializer_class(page.object_list, many=True).data
+        if resolution == 'raw' and not cursor and request.query_params.get('include_archived') in ('1', 'true'):
+            archived = read_archived(patient_id, start, end, reading_type)
+            if len(archived) > MAX_READINGS_PAGE_SIZE:
+                raise ValidationError({
+                    'include_archived': f'More than {MAX_READINGS_PAGE_SIZE} archived readings match; narrow start/end.',
+                })
+            data = archived + list(data)
+        response = Response(data)
+        if page.has_next:
+            params = request.query_params.copy()
+            params['cursor'] = page.next_cursor
+            response['Link'] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        One reading type for a patient as packed columns (see ``wearables.pack_series``):
+        ?patient=&reading_type=&start=&end=&delta=0|1
+        """
+        patient_id = request.query_params.get('patient', '')
+        if not patient_id.isdigit():
+            raise ValidationError({'patient': 'A numeric patient id is required.'})
+        patient_id = int(patient_id)
+        require_patient_access(request, patient_id)
+        reading_type = request.query_params.get('reading_type')
+        if not reading_type:
+            raise ValidationError({'reading_type': 'This query parameter is required.'})
+        start, end = parse_time_range(request.query_params)
+
+        qs = WearableReading.objects.filter(patient_id=patient_id, reading_type=reading_type)
+        if start:
+            qs = qs.filter(timestamp__gte=start)
+        if end:
+            qs = qs.filter(timestamp__lt=end)
+        rows = list(qs.order_by('timestamp').values_list('timestamp', 'value'))
+        payload = pack_series(
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            delta=request.query_params.get('delta', '1') != '0',
+        )
+        response = HttpResponse(payload, content_type='application/octet-stream')
+        response['X-Reading-Count'] = str(len(rows))
+        return response
+
+    @action(detail=True, methods=['post'], url_path='readings/bulk')
+    def bulk_readings(self, request, pk=None):
+        """Append many samples in one request: {"readings": [{reading_type, value, unit, timestamp}, ...]}"""
+        device = self.get_object()
+        serializer = WearableReadingBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        samples = serializer.validated_data['readings']
+        # The first request to claim an Idempotency-Key runs; retries get its answer back
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            cache_key = idempotency_cache_key(device, idempotency_key)
+            if not cache.add(cache_key, IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_TTL):
+                replay = cache.get(cache_key)
+                if replay == IDEMPOTENCY_IN_PROGRESS:
+                    return Response({'detail': 'A request with this Idempotency-Key is in progress.'}, status=status.HTTP_409_CONFLICT)
+                if replay is not None:
+                    return Response(replay, status=status.HTTP_200_OK)
+                cache.set(cache_key, IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_TTL)
+        try:
+            readings = ingest_readings(device, samples)
+        except Exception:
+            if idempotency_key:
+                cache.delete(cache_key)
+            raise
+        body = {
+            'device': device.device_id,
+            'created': len(readings),
+            'duplicates': len(samples) - len(readings),
+        }
+        if idempotency_key:
+            cache.set(cache_key, body, IDEMPOTENCY_TTL)
+        return Response(body, status=status.HTTP_201_CREATED)
+
 class PatientRecordViewSet(viewsets.ModelViewSet):
     queryset = PatientRecord.objects.all()
     serializer_class = PatientRecordSerializer
@@ -74,12 +299,109 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'appointment_date', 'doctor', 'patient']
 
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        A doctor's appointments and consultations from ``start`` to ``end``
+        (inclusive ISO dates, default the current week), grouped by day.
+
+        Doctors get their own calendar; staff pass ``doctor``. Rows are
+        positional lists described once by ``fields``. Send the returned
+        ETag back as If-None-Match to get a 304 while nothing has changed.
+        """
+        if request.user.is_staff and request.query_params.get('doctor'):
+            if not request.query_params['doctor'].isdigit():
+                raise ValidationError({'doctor': 'Expected a doctor id.'})
+            doctor_id = int(request.query_params['doctor'])
+        else:
+            doctor = request.profile.doctor
+            if doctor is None:
+                raise PermissionDenied("Only doctors have a calendar.")
+            doctor_id = doctor.pk
+
+        dates = {}
+        for name in ('start', 'end'):
+            raw = request.query_params.get(name)
+            dates[name] = parse_date(raw) if raw else None
+            if raw and dates[name] is None:
+                raise ValidationError({name: 'Expected an ISO-8601 date.'})
+        start = dates['start'] or timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+        end = dates['end'] or start + timedelta(days=6)
+        if end < start:
+            raise ValidationError({'end': 'Must not be before start.'})
+        if (end - start).days >= MAX_CALENDAR_DAYS:
+            raise ValidationError({'end': f'Ranges are limited to {MAX_CALENDAR_DAYS} days.'})
+
+        etag = quote_etag(calendar_etag(doctor_id, start, end))
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                'doctor': doctor_id,
+                'start': start,
+                'end': end,
+                'fields': {'appointments': APPOINTMENT_FIELDS, 'consultations': CONSULTATION_FIELDS},
+                'days': calendar_days(doctor_id, start, end),
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
 class ConsultationViewSet(viewsets.ModelViewSet):
     queryset = Consultation.objects.all()
     serializer_class = ConsultationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search of consultation and medical record notes (``q``, ``limit`` of 1 to 100).
+
+        Doctors only, over their own patients. Each hit carries a snippet
+        with the matching words wrapped in ``<mark>``; the rest of the
+        snippet is HTML-escaped.
+        """
+        doctor = request.profile.doctor
+        if doctor is None:
+            raise PermissionDenied("Only doctors can search clinical notes.")
+        q = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
+        hits = (search_clinical_notes(doctor, q, limit=limit) or []) if q else []
+        patients = Patient.objects.in_bulk({hit['patient_id'] for hit in hits})
+        return Response({
+            'results': [
+                {
+                    **hit,
+                    'patient_name': f"{patients[hit['patient_id']].first_name} {patients[hit['patient_id']].last_name}",
+                }
+                for hit in hits
+                if hit['patient_id'] in patients
+            ],
+        })
+
 class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+
+    def requester(self):
+        recipient = notifications.recipient_of(self.request.profile)
+        if recipient is None:
+            raise PermissionDenied("Only doctors and patients have notifications.")
+        return recipient
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """The requester's stored unread count, for the bell badge."""
+        return Response({'unread': notifications.unread_count(**self.requester())})
+
+    @action(detail=False, methods=['post'], url_path='mark-all-read')
+    def mark_all_read(self, request):
+        """Mark all of the requesting doctor's unread notifications as read in one UPDATE."""
+        recipient = self.requester()
+        if 'doctor' not in recipient:
+            raise PermissionDenied("Notifications are addressed to doctors; patients cannot mark them read.")
+        return Response({'marked': notifications.mark_all_read(recipient['doctor'])})
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Server-sent event streams.
+
+These views are async and must be served by an ASGI server pointed at
+``AccessHealth.asgi:application`` (e.g. ``uvicorn AccessHealth.asgi:application``);
+under WSGI Django would buffer the whole stream before responding.
+"""
+import asyncio
+import collections
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+
+from .models import Doctor, LatestReading, Patient, WearableReading
+from .access import doctor_can_view_patient
+
+# Seconds between checks for new readings
+VITALS_POLL_INTERVAL = 2
+# Send a comment line this often so proxies keep idle connections open
+VITALS_HEARTBEAT_INTERVAL = 15
+# Close after this many seconds; EventSource reconnects with Last-Event-ID
+VITALS_STREAM_MAX_AGE = 300
+# Cap on readings pushed in one event
+VITALS_BATCH_LIMIT = 500
+# Seconds a reading id must have been visible before the cursor passes it; a
+# transaction that drew a lower id but committed later shows up within this
+VITALS_COMMIT_LAG = 3
+
+READING_FIELDS = ('id', 'reading_type', 'value', 'unit', 'timestamp', 'alert')
+
+
+def sse_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def vital_events(patient_id, last_id):
+    """
+    Yield SSE frames for every reading of ``patient_id`` ingested after ``last_id``.
+
+    Ids are drawn at insert but become visible at commit, so a lower id can
+    appear after a higher one. As with the rollup watermark (see
+    ``rollups.safe_reading_id``), the cursor only moves up to the highest id
+    this stream saw at least ``VITALS_COMMIT_LAG`` seconds ago; newer rows
+    wait for a later poll, so none is skipped on resume either.
+    """
+    if last_id is None:
+        snapshot = [
+            row async for row in LatestReading.objects.filter(patient_id=patient_id)
+            .values('reading_type', 'value', 'unit', 'timestamp')
+        ]
+        newest = await WearableReading.objects.filter(patient_id=patient_id).order_by('-id').values_list('id', flat=True).afirst()
+        last_id = newest or 0
+        yield sse_event('snapshot', snapshot, event_id=last_id)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + VITALS_STREAM_MAX_AGE
+    last_sent = loop.time()
+    # (loop time, highest id seen then), oldest first
+    observed = collections.deque()
+    safe_id = last_id
+    while loop.time() < deadline:
+        rows = [
+            row async for row in WearableReading.objects.filter(patient_id=patient_id, id__gt=last_id)
+            .order_by('id').values(*READING_FIELDS)[:VITALS_BATCH_LIMIT]
+        ]
+        now = loop.time()
+        if rows:
+            observed.append((now, rows[-1]['id']))
+        while observed and observed[0][0] <= now - VITALS_COMMIT_LAG:
+            safe_id = max(safe_id, observed.popleft()[1])
+        ready = [row for row in rows if row['id'] <= safe_id]
+        if ready:
+            last_id = ready[-1]['id']
+            yield sse_event('readings', ready, event_id=last_id)
+            last_sent = now
+        elif now - last_sent >= VITALS_HEARTBEAT_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_sent = now
+        await asyncio.sleep(VITALS_POLL_INTERVAL)
+
+
+@login_required
+async def vitals_stream(request):
+    """
+    Push a patient's new wearable readings as server-sent events.
+
+    Patients stream their own vitals; doctors pass ``?patient=<id>`` for a
+    patient they treat or whose device they are authorised on.
+    """
+    user = await request.auser()
+    patient_id = await Patient.objects.filter(user=user).values_list('pk', flat=True).afirst()
+    if patient_id is None:
+        doctor = await Doctor.objects.filter(user=user).afirst()
+        requested = request.GET.get('patient', '')
+        if doctor is None or not requested.isdigit():
+            return HttpResponseBadRequest("A patient id is required.")
+        if not await sync_to_async(doctor_can_view_patient)(doctor, int(requested)):
+            raise Http404("Patient not found")
+        patient_id = int(requested)
+
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_id = int(last_event_id) if last_event_id.isdigit() else None
+
+    response = StreamingHttpResponse(vital_events(patient_id, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,239 @@
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from django.db import transaction
+from django.utils import timezone
+
+from .alerts import flag_readings, raise_alerts
+from .models import LatestReading, WearableDevice, WearableReading
+
+# Rows per INSERT statement; keeps SQLite under its bound-parameter limit
+INGEST_BATCH_SIZE = 500
+# Upper bound on samples accepted by a single bulk request
+MAX_BULK_READINGS = 10000
+# Recently committed sample keys remembered per process for duplicate rejection
+RECENT_KEYS_MAX = 200000
+# How long a replayed Idempotency-Key returns the original response
+IDEMPOTENCY_TTL = 60 * 60 * 24
+# Claims an Idempotency-Key (cache.add) while its first request is still being handled
+IDEMPOTENCY_IN_PROGRESS = 'in-progress'
+
+
+class RecentReadingKeys:
+    """
+    Bounded LRU set of (device, reading_type, timestamp) keys already written.
+
+    It only saves database work: anything it has forgotten (or never saw,
+    e.g. in another process) is still caught by the unique constraint.
+    """
+
+    def __init__(self, maxsize=RECENT_KEYS_MAX):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            return False
+
+    def add_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+recent_reading_keys = RecentReadingKeys()
+
+
+def reading_key(reading):
+    return (reading.device_id, reading.reading_type, reading.timestamp)
+
+
+def idempotency_cache_key(device, key):
+    return f"wearables:ingest:{device.pk}:{key}"
+
+
+def build_readings(device, samples):
+    """Turn validated sample dicts into unsaved WearableReading rows for ``device``."""
+    now = timezone.now()
+    return [
+        WearableReading(
+            device_id=device.pk,
+            patient_id=device.patient_id,
+            reading_type=sample['reading_type'],
+            value=sample['value'],
+            unit=sample.get('unit', ''),
+            timestamp=sample.get('timestamp') or now,
+        )
+        for sample in samples
+    ]
+
+
+def drop_duplicates(readings):
+    """Remove repeats within the batch and samples already seen by this process."""
+    unique = {}
+    for reading in readings:
+        key = reading_key(reading)
+        if key not in unique and key not in recent_reading_keys:
+            unique[key] = reading
+    return list(unique.values())
+
+
+def existing_keys(device, readings):
+    """Keys of ``readings`` already stored for ``device``, looked up in INGEST_BATCH_SIZE chunks."""
+    timestamps = sorted({reading.timestamp for reading in readings})
+    found = set()
+    for start in range(0, len(timestamps), INGEST_BATCH_SIZE):
+        found.update(
+            WearableReading.objects.filter(device_id=device.pk, timestamp__in=timestamps[start:start + INGEST_BATCH_SIZE])
+            .values_list('device_id', 'reading_type', 'timestamp')
+        )
+    return found
+
+
+def ingest_readings(device, samples):
+    """
+    Append a batch of samples for one device using batched INSERTs.
+
+    ``samples`` is an iterable of dicts with ``reading_type``, ``value`` and
+    optional ``unit`` / ``timestamp``. Duplicates are dropped, first against
+    the in-memory recent-key cache and then against the stored rows, so
+    retried uploads are safe. The device row is locked while checking, so
+    concurrent uploads for it cannot both insert a sample. Returns only the
+    readings actually inserted; the latest-reading store and alerts see
+    nothing else.
+    """
+    readings = drop_duplicates(build_readings(device, samples))
+    if not readings:
+        return readings
+    with transaction.atomic():
+        # Held until commit: concurrent uploads for this device queue up behind it
+        WearableDevice.objects.select_for_update().filter(pk=device.pk).first()
+        stored = existing_keys(device, readings)
+        readings = [reading for reading in readings if reading_key(reading) not in stored]
+        if not readings:
+            recent_reading_keys.add_many(stored)
+            return readings
+        # Thresholds are checked before the INSERT so alert flags are written with the rows
+        flagged = flag_readings(readings)
+        WearableReading.objects.bulk_create(readings, batch_size=INGEST_BATCH_SIZE)
+        update_latest_readings(readings)
+        raise_alerts(device, flagged)
+        keys = [reading_key(reading) for reading in readings]
+        # Only remember keys that actually committed, so a rolled-back batch can be retried
+        transaction.on_commit(lambda: recent_reading_keys.add_many([*keys, *stored]))
+    return readings
+
+
+def record_device_reading(device):
+    """
+    Ingest the value set on ``device.value_of_reading`` as a reading taken now.
+
+    The legacy device create/update endpoints carry a single value on the
+    device row; routing it through ``ingest_readings`` keeps the time
+    series, LatestReading and alerts in step with gateway uploads.
+    """
+    return ingest_readings(device, [{
+        'reading_type': device.reading_type,
+        'value': float(device.value_of_reading),
+        'unit': device.unit,
+    }])
+
+
+def replace_latest_if_newer(reading):
+    """Overwrite the stored latest reading with ``reading`` unless it is newer; returns rows updated."""
+    return LatestReading.objects.filter(
+        patient_id=reading.patient_id,
+        reading_type=reading.reading_type,
+        timestamp__lte=reading.timestamp,
+    ).update(device_id=reading.device_id, value=reading.value, unit=reading.unit, timestamp=reading.timestamp)
+
+
+def update_latest_readings(readings):
+    """
+    Fold a batch into the LatestReading store.
+
+    Only the newest sample per (patient, reading_type) in the batch is
+    considered. The "not older" check is part of each UPDATE's WHERE clause
+    rather than a prior read, so concurrent ingests can never roll the
+    dashboard backwards. Keys with no row yet are inserted with conflicts
+    ignored, then the conditional UPDATE is retried for them in case a
+    concurrent ingest inserted an older row first.
+    """
+    newest = {}
+    for reading in readings:
+        key = (reading.patient_id, reading.reading_type)
+        current = newest.get(key)
+        if current is None or reading.timestamp > current.timestamp:
+            newest[key] = reading
+    if not newest:
+        return
+
+    missing = [reading for reading in newest.values() if not replace_latest_if_newer(reading)]
+    if not missing:
+        return
+    LatestReading.objects.bulk_create(
+        [
+            LatestReading(
+                patient_id=reading.patient_id,
+                device_id=reading.device_id,
+                reading_type=reading.reading_type,
+                value=reading.value,
+                unit=reading.unit,
+                timestamp=reading.timestamp,
+            )
+            for reading in missing
+        ],
+        ignore_conflicts=True,
+    )
+    for reading in missing:
+        replace_latest_if_newer(reading)
+
+
+# Binary series export: little-endian header, then the timestamp column, then values
+SERIES_MAGIC = b'AHV2'
+# magic, flags, 3 pad bytes, count, 4 pad bytes: 16 bytes, so the columns start 8-byte aligned
+SERIES_HEADER = struct.Struct('<4sB3xI4x')
+SERIES_DELTA = 0x01
+SERIES_ALIGNMENT = 8
+
+
+def pad_column(column):
+    return column + b'\0' * (-len(column) % SERIES_ALIGNMENT)
+
+
+def pack_series(timestamps, values, delta=True):
+    """
+    Pack a reading series as columnar binary.
+
+    Layout: a 16-byte ``<4sB3xI4x`` header (magic ``AHV2``, flags, count),
+    then the timestamps as epoch milliseconds and the values as float32.
+    Without the delta flag the timestamps are ``count`` int64s; with it they
+    are one int64 start followed by ``count - 1`` int32 gaps, which is used
+    only when every gap fits. Each column starts on an 8-byte boundary
+    (zero-padded), so a client can map it straight onto a typed array.
+    """
+    millis = np.fromiter((round(t.timestamp() * 1000) for t in timestamps), dtype='<i8', count=len(timestamps))
+    flags = 0
+    if delta and millis.size:
+        gaps = np.diff(millis)
+        if gaps.size == 0 or (gaps.min() >= np.iinfo('<i4').min and gaps.max() <= np.iinfo('<i4').max):
+            flags |= SERIES_DELTA
+            time_column = millis[:1].tobytes() + gaps.astype('<i4').tobytes()
+    if not flags & SERIES_DELTA:
+        time_column = millis.tobytes()
+    value_column = np.asarray(values, dtype='<f4').tobytes()
+    return SERIES_HEADER.pack(SERIES_MAGIC, flags, millis.size) + pad_column(time_column) + pad_column(value_column)